@@ -0,0 +1,87 @@
+"""
+Autenticación JWT sin consulta a la base: el rol del usuario viaja en el token.
+
+Cuando AdminUserViewSet modifica o elimina un usuario se marca en Redis; los
+tokens emitidos antes de esa marca vuelven a la consulta normal por id. Las
+marcas no usan la caché de Django: cambiar CACHE_VERSION o llamar a
+cache.clear() no debe devolverle los claims viejos a un admin degradado.
+"""
+import logging
+import time
+
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from core import metrics
+from core.redis_client import get_redis
+from products.models import User
+
+logger = logging.getLogger(__name__)
+
+USER_CHANGED_KEY = 'auth:user-changed:{}'
+CLAIMS = ('role', 'is_superuser', 'username', 'auth_time')
+
+
+def mark_user_changed(user_id):
+    """
+    Invalida los claims de todos los tokens del usuario emitidos hasta ahora.
+    Se llama antes de guardar el cambio. Si Redis no responde la excepción se
+    propaga y el usuario queda como estaba: es preferible que la petición falle
+    a que los tokens conserven un rol que ya no tienen.
+    """
+    # Los access tokens derivados de un refresh conservan sus claims hasta que este expira
+    timeout = int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+    get_redis().set(USER_CHANGED_KEY.format(user_id), int(time.time()), ex=timeout)
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Agrega al token los datos que necesita IsAdminUser"""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['role'] = user.role
+        token['is_superuser'] = user.is_superuser
+        token['username'] = user.username
+        # Momento del login; se copia a los access tokens que se generan con el refresh
+        token['auth_time'] = int(time.time())
+        return token
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    Construye request.user desde los claims del token. Usa la consulta de
+    JWTAuthentication si el modo está desactivado, el token no trae los claims
+    o el usuario cambió después del login.
+    """
+    def authenticate(self, request):
+        with metrics.authentication():
+            return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if not settings.JWT_STATELESS_AUTH or not all(claim in validated_token for claim in CLAIMS):
+            return super().get_user(validated_token)
+
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        try:
+            changed_at = get_redis().get(USER_CHANGED_KEY.format(user_id))
+        except Exception as e:
+            # Sin Redis no se sabe si los claims siguen vigentes: se consulta la base
+            logger.warning(f"No se pudo verificar la invalidación del token: {str(e)}")
+            return super().get_user(validated_token)
+        if changed_at is not None and validated_token['auth_time'] <= int(changed_at):
+            return super().get_user(validated_token)
+
+        user = User(
+            id=user_id,
+            username=validated_token['username'],
+            role=validated_token['role'],
+            is_superuser=validated_token['is_superuser'],
+            is_active=True
+        )
+        # Instancia equivalente a una cargada de la base, utilizable en claves foráneas
+        user._state.adding = False
+        user._state.db = 'default'
+        return user
@@ -0,0 +1,234 @@
+"""
+Backends de caché sobre el pool de Redis de core.redis_client.
+
+- PooledRedisCache: el RedisCache de Django, pero usando el mismo pool de
+  conexiones que el resto del proceso (throttling, métricas, HyperLogLog).
+- TieredRedisCache: agrega una capa en memoria del proceso delante de Redis.
+  Cada escritura publica la clave en CACHE_INVALIDATION_CHANNEL y un hilo por
+  proceso la descarta de la memoria local. CACHE_LOCAL_TIMEOUT acota cuánto
+  puede quedar obsoleto un valor local si se pierde un mensaje.
+
+Ambos cuentan aciertos y fallos por capa en core.metrics (cache_requests_total).
+Si Redis no responde la caché no interrumpe la petición, igual que el
+throttling: las lecturas fallidas son fallos de caché y las escrituras
+fallidas solo se registran en el log.
+"""
+import functools
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache, RedisCacheClient
+from redis.exceptions import RedisError
+
+from core import metrics
+from core.redis_client import get_pool, get_redis
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+# Mensaje de invalidación que vacía toda la capa local
+CLEAR_ALL = '*'
+
+# Django crea una instancia del backend por hilo; la capa local y el hilo de
+# invalidación son del proceso. LocMemCache comparte el almacenamiento por nombre.
+_listener_lock = threading.Lock()
+_listener_pid = None
+
+
+def _count(tier, result):
+    metrics.registry.inc('cache_requests_total', {'tier': tier, 'result': result})
+
+
+def is_shared(cache):
+    """False si cada proceso ve su propia caché (locmem, dummy)"""
+    return not isinstance(cache, (LocMemCache, DummyCache))
+
+
+def _local_cache():
+    return LocMemCache('core.cache.local', {
+        'TIMEOUT': settings.CACHE_LOCAL_TIMEOUT,
+        'OPTIONS': {'MAX_ENTRIES': settings.CACHE_LOCAL_MAX_ENTRIES},
+    })
+
+
+def _listen():
+    local = _local_cache()
+    while True:
+        try:
+            pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(settings.CACHE_INVALIDATION_CHANNEL)
+            while True:
+                message = pubsub.get_message(timeout=1.0)
+                if message is None:
+                    continue
+                key = message['data'].decode()
+                if key == CLEAR_ALL:
+                    local.clear()
+                else:
+                    local.delete(key)
+        except Exception as e:
+            # Durante la desconexión pudieron perderse invalidaciones
+            logger.warning(f"Se perdió la suscripción de invalidación de caché: {str(e)}")
+            local.clear()
+            time.sleep(1)
+
+
+def _ensure_listener():
+    """Arranca el hilo de invalidación una vez por proceso (también tras un fork)"""
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    with _listener_lock:
+        if _listener_pid != os.getpid():
+            threading.Thread(target=_listen, name='cache-invalidation', daemon=True).start()
+            _listener_pid = os.getpid()
+
+
+def _tolerant(method, fallback):
+    """Método del cliente que ante un error de Redis registra y devuelve fallback(*args)"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        except RedisError as e:
+            logger.warning(f"Caché no disponible ({method.__name__}): {str(e)}")
+            return fallback(*args, **kwargs)
+    return wrapper
+
+
+def _failed(*args, **kwargs):
+    return False
+
+
+def _nothing(*args, **kwargs):
+    return None
+
+
+class PooledRedisCacheClient(RedisCacheClient):
+    def _get_connection_pool(self, write):
+        return get_pool()
+
+    get = _tolerant(RedisCacheClient.get, lambda key, default: default)
+    get_many = _tolerant(RedisCacheClient.get_many, lambda keys: {})
+    has_key = _tolerant(RedisCacheClient.has_key, _failed)
+    set = _tolerant(RedisCacheClient.set, _nothing)
+    add = _tolerant(RedisCacheClient.add, _failed)
+    touch = _tolerant(RedisCacheClient.touch, _failed)
+    delete = _tolerant(RedisCacheClient.delete, _failed)
+    set_many = _tolerant(RedisCacheClient.set_many, _nothing)
+    delete_many = _tolerant(RedisCacheClient.delete_many, _nothing)
+
+
+class PooledRedisCache(RedisCache):
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        self._class = PooledRedisCacheClient
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        if value is _MISSING:
+            _count('redis', 'miss')
+            return default
+        _count('redis', 'hit')
+        return value
+
+    def clear(self):
+        # flushdb borraría también el throttling, los HyperLogLog y las métricas
+        # que comparten la base de Redis: solo se borran las claves del prefijo
+        redis = get_redis()
+        batch = []
+        try:
+            for key in redis.scan_iter(match=f'{self.key_prefix}:*', count=1000):
+                batch.append(key)
+                if len(batch) >= 1000:
+                    redis.delete(*batch)
+                    batch = []
+            if batch:
+                redis.delete(*batch)
+        except RedisError as e:
+            logger.warning(f"Caché no disponible (clear): {str(e)}")
+            return False
+        return True
+
+
+class TieredRedisCache(PooledRedisCache):
+    # Lecturas múltiples también a través de la capa local
+    get_many = BaseCache.get_many
+
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        self._local = _local_cache()
+
+    def _invalidate(self, *keys):
+        for key in keys:
+            if key == CLEAR_ALL:
+                self._local.clear()
+            else:
+                self._local.delete(key)
+            try:
+                get_redis().publish(settings.CACHE_INVALIDATION_CHANNEL, key)
+            except RedisError as e:
+                # Los demás procesos conservan su copia hasta CACHE_LOCAL_TIMEOUT
+                logger.warning(f"No se pudo publicar la invalidación de caché: {str(e)}")
+
+    def get(self, key, default=None, version=None):
+        _ensure_listener()
+        key = self.make_and_validate_key(key, version=version)
+        value = self._local.get(key, _MISSING)
+        if value is not _MISSING:
+            _count('local', 'hit')
+            return value
+        _count('local', 'miss')
+
+        value = self._cache.get(key, _MISSING)
+        if value is _MISSING:
+            _count('redis', 'miss')
+            return default
+        _count('redis', 'hit')
+        self._local.set(key, value)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        super().set(key, value, timeout, version)
+        self._invalidate(self.make_and_validate_key(key, version=version))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = super().add(key, value, timeout, version)
+        if added:
+            self._invalidate(self.make_and_validate_key(key, version=version))
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        touched = super().touch(key, timeout, version)
+        self._invalidate(self.make_and_validate_key(key, version=version))
+        return touched
+
+    def delete(self, key, version=None):
+        deleted = super().delete(key, version)
+        self._invalidate(self.make_and_validate_key(key, version=version))
+        return deleted
+
+    def incr(self, key, delta=1, version=None):
+        value = super().incr(key, delta, version)
+        self._invalidate(self.make_and_validate_key(key, version=version))
+        return value
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = super().set_many(data, timeout, version)
+        self._invalidate(*(self.make_and_validate_key(key, version=version) for key in data))
+        return failed
+
+    def delete_many(self, keys, version=None):
+        super().delete_many(keys, version)
+        self._invalidate(*(self.make_and_validate_key(key, version=version) for key in keys))
+
+    def clear(self):
+        cleared = super().clear()
+        self._invalidate(CLEAR_ALL)
+        return cleared
@@ -1,5 +1,7 @@
 import os
+import time
 from celery import Celery
+from celery.signals import task_prerun, task_postrun
 
 # Establece el módulo Django por defecto
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
@@ -10,4 +12,27 @@ app = Celery('core')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
 # Busca tareas en todas las apps de Django
-app.autodiscover_tasks()
\ No newline at end of file
+app.autodiscover_tasks()
+
+# Métricas por tarea: consultas, tiempo de DB y duración total
+_task_metrics = {}
+
+
+@task_prerun.connect
+def start_task_metrics(task_id=None, task=None, **kwargs):
+    from core import metrics
+    stats = metrics.new_stats()
+    collector = metrics.collect(stats)
+    collector.__enter__()
+    _task_metrics[task_id] = (stats, collector, time.perf_counter())
+
+
+@task_postrun.connect
+def finish_task_metrics(task_id=None, task=None, state=None, **kwargs):
+    from core import metrics
+    entry = _task_metrics.pop(task_id, None)
+    if entry is None:
+        return
+    stats, collector, started = entry
+    collector.__exit__(None, None, None)
+    metrics.observe_task(task.name, state, stats, time.perf_counter() - started)
@@ -0,0 +1,88 @@
+"""
+Enrutamiento de lecturas hacia réplicas de PostgreSQL.
+
+Solo las peticiones de lectura marcadas por ReplicaRoutingMiddleware usan réplicas;
+las escrituras, las tareas de Celery y cualquier otro código siguen en 'default'.
+"""
+import contextvars
+import logging
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_read_from_replica = contextvars.ContextVar('read_from_replica', default=False)
+
+# alias -> (momento de la verificación, réplica utilizable)
+_replica_health = {}
+
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith('replica_')]
+
+
+@contextmanager
+def replica_reads():
+    """Permite que las lecturas dentro del bloque vayan a una réplica"""
+    token = _read_from_replica.set(True)
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+def replication_lag(alias):
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(REPLICA_LAG_SQL)
+        return float(cursor.fetchone()[0])
+
+
+def is_replica_usable(alias):
+    """Verifica el retraso de replicación como máximo cada REPLICA_LAG_CHECK_INTERVAL segundos"""
+    checked_at, usable = _replica_health.get(alias, (0, False))
+    if time.monotonic() - checked_at < settings.REPLICA_LAG_CHECK_INTERVAL:
+        return usable
+
+    try:
+        lag = replication_lag(alias)
+        usable = lag <= settings.REPLICA_MAX_LAG_SECONDS
+        if not usable:
+            logger.warning(f"Réplica {alias} con {lag:.1f}s de retraso; se usa la primaria")
+    except Exception as e:
+        usable = False
+        logger.warning(f"Réplica {alias} no disponible: {str(e)}")
+    _replica_health[alias] = (time.monotonic(), usable)
+    return usable
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _read_from_replica.get():
+            return None
+        replicas = [alias for alias in replica_aliases() if is_replica_usable(alias)]
+        return random.choice(replicas) if replicas else 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Todas las bases contienen los mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
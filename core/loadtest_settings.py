@@ -0,0 +1,27 @@
+"""
+Settings para `manage.py loadtest` sin PostgreSQL, Redis ni worker de Celery:
+
+    DJANGO_SETTINGS_MODULE=core.loadtest_settings python manage.py loadtest
+
+La base es un archivo SQLite, Redis se sustituye por fakeredis
+(pip install "fakeredis[lua]") y las tareas de Celery se ejecutan en una cola
+dentro del proceso. Sirve para comparar cambios entre sí, no para dimensionar
+producción: para eso se corre loadtest con core.settings contra los servicios reales.
+"""
+from core.settings import *  # noqa: F401,F403
+from core.settings import BASE_DIR
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'loadtest.sqlite3',
+        # Archivo y no memoria: los hilos compiten por el lock de escritura como en disco
+        # Las tablas se crean desde los modelos, como en bench.isolated_database
+        'TEST': {'NAME': BASE_DIR / 'loadtest.sqlite3', 'MIGRATE': False},
+        'OPTIONS': {'timeout': 20},
+    }
+}
+
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+LOADTEST_STAND_INS = True
@@ -0,0 +1,294 @@
+"""
+Métricas de rendimiento (consultas SQL, tiempo de DB, serialización y latencia)
+expuestas en formato de texto de Prometheus.
+
+Cada proceso (workers de gunicorn, ASGI y Celery) acumula sus contadores en
+memoria y los suma cada METRICS_FLUSH_SECONDS a un hash de Redis: la respuesta
+de /internal/metrics/ es la misma sin importar qué worker atienda el scrape.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+from core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Hashes de Redis donde se acumulan las métricas de todos los procesos
+WEB_METRICS_KEY = 'metrics:web'
+CELERY_METRICS_KEY = 'metrics:celery'
+
+METRIC_HELP = {
+    'http_requests_total': ('counter', 'Peticiones HTTP atendidas'),
+    'http_request_duration_seconds': ('summary', 'Latencia total por endpoint'),
+    'http_request_db_queries_total': ('counter', 'Consultas SQL ejecutadas por endpoint'),
+    'http_request_db_duration_seconds_total': ('counter', 'Tiempo en base de datos por endpoint'),
+    'http_request_serialization_seconds_total': ('counter', 'Tiempo de serialización de respuestas'),
+    'query_budget_exceeded_total': ('counter', 'Peticiones que superaron su presupuesto de consultas'),
+    'cache_requests_total': ('counter', 'Lecturas de caché por capa (local, redis) y resultado'),
+    'celery_tasks_total': ('counter', 'Tareas de Celery ejecutadas'),
+    'celery_task_duration_seconds_total': ('counter', 'Tiempo total de ejecución de tareas'),
+    'celery_task_db_queries_total': ('counter', 'Consultas SQL ejecutadas por tarea'),
+    'celery_task_db_duration_seconds_total': ('counter', 'Tiempo en base de datos por tarea'),
+}
+
+# Estadísticas de la petición o tarea en curso, y todas las activas (pueden anidarse)
+_current_stats = contextvars.ContextVar('metrics_current_stats', default=None)
+_active_stats = contextvars.ContextVar('metrics_active_stats', default=())
+# True mientras DRF autentica la petición (ver authentication())
+_authenticating = contextvars.ContextVar('metrics_authenticating', default=False)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Un endpoint ejecutó más consultas de las permitidas en QUERY_BUDGETS"""
+
+
+class MetricsRegistry:
+    """
+    Incrementos pendientes del proceso, seguros entre hilos. flush() los suma
+    a WEB_METRICS_KEY; si Redis no responde se conservan para el siguiente intento.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last_flush = time.monotonic()
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + value
+            due = time.monotonic() - self._last_flush >= settings.METRICS_FLUSH_SECONDS
+            if due:
+                self._last_flush = time.monotonic()
+        if due:
+            self.flush()
+
+    def observe(self, name, labels, value):
+        self.inc(f'{name}_sum', labels, value)
+        self.inc(f'{name}_count', labels)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for (name, labels), value in pending.items():
+                pipe.hincrbyfloat(WEB_METRICS_KEY, json.dumps([name, labels]), value)
+            pipe.execute()
+        except Exception as e:
+            logger.debug(f"No se pudieron publicar métricas: {str(e)}")
+            with self._lock:
+                for key, value in pending.items():
+                    self._pending[key] = self._pending.get(key, 0) + value
+
+
+registry = MetricsRegistry()
+# Lo pendiente de un worker que termina (max_requests de gunicorn, despliegues)
+atexit.register(registry.flush)
+
+
+def new_stats():
+    return {'queries': 0, 'auth_queries': 0, 'db_time': 0.0, 'serialization_time': 0.0}
+
+
+def current_stats():
+    return _current_stats.get()
+
+
+class QueryCounter:
+    """execute_wrapper que acumula consultas y tiempo de DB en `stats`"""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def __call__(self, execute, sql, params, many, context):
+        # Bajo ASGI varias peticiones pueden compartir hilo y conexión:
+        # solo se cuentan las consultas del contexto que activó estas estadísticas
+        if not any(stats is self.stats for stats in _active_stats.get()):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.stats['queries'] += 1
+            if _authenticating.get():
+                self.stats['auth_queries'] += 1
+            self.stats['db_time'] += time.perf_counter() - started
+
+
+def activate(stats):
+    return _current_stats.set(stats), _active_stats.set(_active_stats.get() + (stats,))
+
+
+def deactivate(tokens):
+    current, active = tokens
+    _active_stats.reset(active)
+    _current_stats.reset(current)
+
+
+@contextmanager
+def collect(stats):
+    """Cuenta consultas y tiempo de DB en todas las conexiones mientras dura el bloque"""
+    tokens = activate(stats)
+    counter = QueryCounter(stats)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            yield stats
+    finally:
+        deactivate(tokens)
+
+
+@contextmanager
+def authentication():
+    """
+    Marca las consultas de la autenticación: se registran, pero no cuentan para
+    QUERY_BUDGETS porque dependen del modo (JWT_STATELESS_AUTH) y no del endpoint.
+    """
+    token = _authenticating.set(True)
+    try:
+        yield
+    finally:
+        _authenticating.reset(token)
+
+
+def attach(counter):
+    """Versión sin context manager de collect(), para el camino asíncrono"""
+    for connection in connections.all():
+        connection.execute_wrappers.append(counter)
+
+
+def detach(counter):
+    for connection in connections.all():
+        if counter in connection.execute_wrappers:
+            connection.execute_wrappers.remove(counter)
+
+
+def record_serialization(seconds):
+    stats = _current_stats.get()
+    if stats is not None:
+        stats['serialization_time'] += seconds
+
+
+def observe_request(endpoint, method, status_code, stats, duration):
+    labels = {'endpoint': endpoint}
+    registry.inc('http_requests_total', {**labels, 'method': method, 'status': str(status_code)})
+    registry.observe('http_request_duration_seconds', labels, duration)
+    registry.inc('http_request_db_queries_total', labels, stats['queries'])
+    registry.inc('http_request_db_duration_seconds_total', labels, stats['db_time'])
+    registry.inc('http_request_serialization_seconds_total', labels, stats['serialization_time'])
+
+
+def check_budget(method, endpoint, stats):
+    """Compara las consultas contra QUERY_BUDGETS; en modo estricto lanza excepción"""
+    budget = settings.QUERY_BUDGETS.get(f'{method} {endpoint}')
+    queries = stats['queries'] - stats['auth_queries']
+    if budget is None or queries <= budget:
+        return
+    registry.inc('query_budget_exceeded_total', {'endpoint': endpoint})
+    message = (
+        f"{method} {endpoint} ejecutó {queries} consultas (presupuesto: {budget}), "
+        f"más {stats['auth_queries']} de autenticación"
+    )
+    if settings.QUERY_BUDGET_STRICT:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def observe_task(task_name, state, stats, duration):
+    """Acumula las métricas de una tarea en Redis para que el endpoint web las exponga"""
+    fields = {
+        f'celery_tasks_total|{task_name}|{state}': 1,
+        f'celery_task_duration_seconds_total|{task_name}|': duration,
+        f'celery_task_db_queries_total|{task_name}|': stats['queries'],
+        f'celery_task_db_duration_seconds_total|{task_name}|': stats['db_time'],
+    }
+    logger.info(
+        f"Tarea {task_name} ({state}): {stats['queries']} consultas, "
+        f"{stats['db_time']:.3f}s en DB, {duration:.3f}s en total"
+    )
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for field, value in fields.items():
+            pipe.hincrbyfloat(CELERY_METRICS_KEY, field, value)
+        pipe.execute()
+    except Exception as e:
+        logger.debug(f"No se pudieron publicar métricas de Celery: {str(e)}")
+
+
+def _web_samples():
+    try:
+        raw = get_redis().hgetall(WEB_METRICS_KEY)
+    except Exception as e:
+        logger.debug(f"No se pudieron leer métricas web: {str(e)}")
+        return {}
+    samples = {}
+    for field, value in raw.items():
+        name, labels = json.loads(field)
+        samples[(name, tuple(tuple(pair) for pair in labels))] = float(value)
+    return samples
+
+
+def _celery_samples():
+    try:
+        raw = get_redis().hgetall(CELERY_METRICS_KEY)
+    except Exception as e:
+        logger.debug(f"No se pudieron leer métricas de Celery: {str(e)}")
+        return {}
+    samples = {}
+    for field, value in raw.items():
+        name, task_name, state = field.decode().split('|')
+        labels = {'task': task_name}
+        if state:
+            labels['state'] = state
+        samples[(name, tuple(sorted(labels.items())))] = float(value)
+    return samples
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{key}="{value}"' for key, value in labels)
+    return '{' + pairs + '}'
+
+
+def render(samples):
+    """Serializa las muestras al formato de exposición de texto de Prometheus"""
+    by_name = {}
+    for (name, labels), value in samples.items():
+        by_name.setdefault(name, []).append((labels, value))
+
+    lines = []
+    documented = set()
+    for name in sorted(by_name):
+        base = name.rsplit('_', 1)[0] if name.endswith(('_sum', '_count')) else name
+        if base in METRIC_HELP and base not in documented:
+            metric_type, help_text = METRIC_HELP[base]
+            lines.append(f'# HELP {base} {help_text}')
+            lines.append(f'# TYPE {base} {metric_type}')
+            documented.add(base)
+        for labels, value in sorted(by_name[name]):
+            lines.append(f'{name}{_format_labels(labels)} {value:g}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Endpoint interno con las métricas de todos los procesos web y workers de Celery"""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    registry.flush()
+    samples = _web_samples()
+    samples.update(_celery_samples())
+    return HttpResponse(render(samples), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,160 @@
+import time
+from ipaddress import ip_address, ip_network
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core import db_router, metrics
+from core.cache import is_shared
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def _is_trusted_proxy(address):
+    try:
+        address = ip_address(address)
+    except ValueError:
+        return False
+    return any(address in ip_network(proxy, strict=False) for proxy in settings.TRUSTED_PROXIES)
+
+
+def client_ip(request):
+    """
+    IP del cliente. X-Real-IP (lo envía nginx) solo se acepta si la conexión
+    viene de TRUSTED_PROXIES: cualquier otro cliente podría rotarlo para
+    esquivar el throttle y la deduplicación de vistas.
+    """
+    remote_addr = request.META.get('REMOTE_ADDR', '')
+    if _is_trusted_proxy(remote_addr):
+        return request.META.get('HTTP_X_REAL_IP', remote_addr)
+    return remote_addr
+
+
+def token_user_id(request):
+    """
+    Id del usuario del access token de Authorization, o None si no hay uno
+    válido. Verifica firma, expiración y tipo sin consultar la base; el
+    resultado se memoriza en la petición.
+    """
+    if not hasattr(request, '_token_user_id'):
+        request._token_user_id = None
+        parts = request.META.get('HTTP_AUTHORIZATION', '').split()
+        if len(parts) == 2 and parts[0] in api_settings.AUTH_HEADER_TYPES:
+            try:
+                request._token_user_id = AccessToken(parts[1]).get(api_settings.USER_ID_CLAIM)
+            except TokenError:
+                pass
+    return request._token_user_id
+
+
+def client_key(request):
+    """
+    Identifica al cliente por el usuario de su token o, si no trae un token
+    válido, por su IP: un header inventado no debe dar un bucket nuevo.
+    """
+    user_id = token_user_id(request)
+    if user_id is not None:
+        return f'user:{user_id}'
+    return 'ip:' + client_ip(request)
+
+
+class HybridMiddleware:
+    """Base para middlewares que funcionan tanto bajo WSGI como bajo ASGI"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.handle(request)
+
+
+class QueryMetricsMiddleware(HybridMiddleware):
+    """
+    Registra por endpoint el número de consultas SQL, el tiempo en DB,
+    el tiempo de serialización y la latencia total de cada petición.
+    """
+    def handle(self, request):
+        stats = metrics.new_stats()
+        started = time.perf_counter()
+        with metrics.collect(stats):
+            response = self.get_response(request)
+        self._observe(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        stats = metrics.new_stats()
+        counter = metrics.QueryCounter(stats)
+        started = time.perf_counter()
+        tokens = metrics.activate(stats)
+        # El ORM asíncrono ejecuta las consultas en el hilo de sync_to_async de la petición
+        await sync_to_async(metrics.attach)(counter)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(metrics.detach)(counter)
+            metrics.deactivate(tokens)
+        self._observe(request, response, stats, time.perf_counter() - started)
+        return response
+
+    def _observe(self, request, response, stats, duration):
+        match = request.resolver_match
+        endpoint = match.view_name if match else 'unmatched'
+        metrics.observe_request(endpoint, request.method, response.status_code, stats, duration)
+        metrics.check_budget(request.method, endpoint, stats)
+
+
+class ReplicaRoutingMiddleware(HybridMiddleware):
+    """
+    Envía las lecturas de peticiones seguras a las réplicas. Después de una escritura,
+    el mismo cliente lee de la primaria durante REPLICA_PIN_SECONDS (read-your-writes).
+    """
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        # Con una caché por proceso la escritura atendida por un worker no fija
+        # las lecturas que atiende otro: se leerían datos viejos de la réplica
+        if db_router.replica_aliases() and not is_shared(caches['default']):
+            raise ImproperlyConfigured(
+                'Las réplicas de lectura (DB_REPLICA_HOSTS) necesitan una caché compartida '
+                'entre procesos: CACHE_MODE=redis o tiered'
+            )
+
+    def handle(self, request):
+        if not db_router.replica_aliases():
+            return self.get_response(request)
+
+        pin_key = f'replica-pin:{client_key(request)}'
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            cache.set(pin_key, True, settings.REPLICA_PIN_SECONDS)
+            return response
+
+        if cache.get(pin_key):
+            return self.get_response(request)
+        with db_router.replica_reads():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not db_router.replica_aliases():
+            return await self.get_response(request)
+
+        pin_key = f'replica-pin:{client_key(request)}'
+        if request.method not in SAFE_METHODS:
+            response = await self.get_response(request)
+            await cache.aset(pin_key, True, settings.REPLICA_PIN_SECONDS)
+            return response
+
+        if await cache.aget(pin_key):
+            return await self.get_response(request)
+        with db_router.replica_reads():
+            return await self.get_response(request)
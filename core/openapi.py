@@ -0,0 +1,70 @@
+"""
+Esquema OpenAPI precalculado.
+
+El comando generate_openapi lo escribe en STATIC_ROOT/openapi.json durante el
+despliegue y nginx lo sirve como archivo estático en /openapi.json, que es la
+URL que cargan Swagger UI y ReDoc (SPEC_URL). Si el archivo no existe (por
+ejemplo en desarrollo), openapi_view lo genera una sola vez por proceso y
+versión de despliegue.
+
+Este módulo importa drf_yasg: core.urls lo carga en la primera petición.
+"""
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson
+from drf_yasg.generators import OpenAPISchemaGenerator
+from drf_yasg.views import get_schema_view
+from rest_framework import permissions
+
+API_INFO = openapi.Info(
+    title="Product Management API",
+    default_version='v1',
+    description="API para gestión de productos con sistema de notificaciones",
+    terms_of_service="https://www.tudominio.com/terms/",
+    contact=openapi.Contact(email="soporte@tudominio.com"),
+    license=openapi.License(name="BSD License"),
+)
+
+schema_view = get_schema_view(
+    API_INFO,
+    public=True,
+    permission_classes=(permissions.AllowAny,),
+)
+
+# Esquemas generados en este proceso, por DEPLOY_VERSION
+_schemas = {}
+_lock = threading.Lock()
+
+
+def schema_path():
+    return Path(settings.STATIC_ROOT) / 'openapi.json'
+
+
+def generate_schema():
+    """Introspecciona todas las vistas y devuelve el esquema en JSON (bytes)"""
+    generator = OpenAPISchemaGenerator(API_INFO)
+    return OpenAPICodecJson(validators=[]).encode(generator.get_schema(request=None, public=True))
+
+
+def get_schema():
+    """El artefacto de generate_openapi si existe; si no, se genera y se guarda en memoria"""
+    schema = _schemas.get(settings.DEPLOY_VERSION)
+    if schema is None:
+        with _lock:
+            schema = _schemas.get(settings.DEPLOY_VERSION)
+            if schema is None:
+                path = schema_path()
+                schema = path.read_bytes() if path.exists() else generate_schema()
+                _schemas[settings.DEPLOY_VERSION] = schema
+    return schema
+
+
+def openapi_view(request):
+    response = HttpResponse(get_schema(), content_type='application/json')
+    patch_cache_control(response, public=True, max_age=settings.OPENAPI_CACHE_SECONDS)
+    return response
@@ -0,0 +1,22 @@
+import redis
+from django.conf import settings
+
+_pool = None
+
+
+def get_pool():
+    """Pool de conexiones compartido por el proceso (también lo usa la caché de Django)"""
+    global _pool
+    if _pool is None:
+        _pool = redis.ConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT
+        )
+    return _pool
+
+
+def get_redis():
+    """Cliente de Redis sobre un pool de conexiones compartido por el proceso"""
+    return redis.Redis(connection_pool=get_pool())
@@ -0,0 +1,16 @@
+import time
+
+from rest_framework.renderers import JSONRenderer
+
+from core import metrics
+
+
+class InstrumentedJSONRenderer(JSONRenderer):
+    """JSONRenderer que reporta su tiempo de serialización a core.metrics"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        started = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            metrics.record_serialization(time.perf_counter() - started)
@@ -12,8 +12,10 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv
 from datetime import timedelta
+from celery.schedules import crontab
 from os.path import join
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -47,13 +49,14 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'products',
     'rest_framework',
-    'django_filters',
     'corsheaders',
     'drf_yasg',
     'rest_framework.authtoken'
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryMetricsMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,11 +85,18 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'core.wsgi.application'
+ASGI_APPLICATION = 'core.asgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Segundos que una conexión se reutiliza entre peticiones (web) o tareas (Celery); 0 = una por petición.
+# Bajo ASGI debe ser 0: cada petición corre en un hilo nuevo y la conexión no se reutiliza
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', 60))
+# True si DB_HOST apunta a PgBouncer en pool_mode=transaction
+DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', 'False') == 'True'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -95,9 +105,37 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
         'PORT': os.getenv('DB_PORT'),
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        # Verifica la conexión persistente antes de reutilizarla en una nueva petición
+        'CONN_HEALTH_CHECKS': True,
+        # Los cursores del lado del servidor (QuerySet.iterator()) no sobreviven
+        # entre transacciones cuando PgBouncer reasigna la conexión
+        'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER,
+        'OPTIONS': {
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),
+        },
     }
 }
 
+# Réplicas de lectura: DB_REPLICA_HOSTS=host1[:puerto],host2[:puerto]
+# Requieren CACHE_MODE redis o tiered: la marca read-your-writes vive en la caché
+for index, replica in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(','))):
+    replica_host, _, replica_port = replica.partition(':')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': replica_host,
+        'PORT': replica_port or DATABASES['default']['PORT'],
+        # En tests las réplicas apuntan a la base de prueba de 'default'
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+# Segundos que un cliente lee de la primaria después de escribir
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+# Retraso máximo de replicación tolerado antes de volver a la primaria
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', 2))
+REPLICA_LAG_CHECK_INTERVAL = int(os.getenv('REPLICA_LAG_CHECK_INTERVAL', 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -140,6 +178,41 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Redis para la aplicación (throttling, métricas); pool compartido en core.redis_client
+REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/1')
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', 50))
+REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', 0.5))
+
+# Caché (core.cache): 'redis' compartida entre procesos, 'tiered' con una capa en
+# memoria del proceso invalidada por pub/sub, o 'locmem' por proceso (solo desarrollo)
+CACHE_MODE = os.getenv('CACHE_MODE', 'redis')
+CACHE_BACKENDS = {
+    'redis': 'core.cache.PooledRedisCache',
+    'tiered': 'core.cache.TieredRedisCache',
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+}
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_MODE],
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': os.getenv('CACHE_KEY_PREFIX', 'catalog'),
+        # Incrementar la versión invalida todas las claves anteriores sin borrarlas
+        'VERSION': int(os.getenv('CACHE_VERSION', 1)),
+        'TIMEOUT': 300,
+    }
+}
+# TTL en segundos por uso de la caché
+CACHE_TTLS = {
+    'product_stats': int(os.getenv('PRODUCT_STATS_CACHE_SECONDS', 30)),
+    'view_analytics': int(os.getenv('VIEW_ANALYTICS_CACHE_SECONDS', 60)),
+    # Se invalida al cambiar cualquier usuario (products.admin_users.bump_list_version)
+    'admin_users': int(os.getenv('ADMIN_USERS_CACHE_SECONDS', 300)),
+}
+# Modo 'tiered': vida máxima de un valor en la memoria del proceso y canal de invalidación
+CACHE_LOCAL_TIMEOUT = int(os.getenv('CACHE_LOCAL_TIMEOUT', 5))
+CACHE_LOCAL_MAX_ENTRIES = int(os.getenv('CACHE_LOCAL_MAX_ENTRIES', 1000))
+CACHE_INVALIDATION_CHANNEL = 'cache:invalidate'
+
 # Celery settings
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://redis:6379/0')
@@ -148,23 +221,129 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# Las tareas usan el pool de core.redis_client; esto acota las conexiones del backend de resultados
+CELERY_REDIS_MAX_CONNECTIONS = REDIS_MAX_CONNECTIONS
+# Mantenimiento periódico (products.tasks), ejecutado por celery-beat
+CELERY_BEAT_SCHEDULE = {
+    'purge-read-notifications': {
+        'task': 'products.tasks.purge_read_notifications',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'compact-product-changes': {
+        'task': 'products.tasks.compact_product_changes',
+        'schedule': crontab(hour=3, minute=30),
+    },
+    'rollup-unique-views': {
+        'task': 'products.tasks.rollup_unique_views',
+        'schedule': crontab(minute=15),
+    },
+    'flush-brand-views': {
+        'task': 'products.tasks.flush_brand_views',
+        'schedule': float(os.getenv('BRAND_VIEWS_FLUSH_SECONDS', 60)),
+    },
+    'rebuild-brand-aggregates': {
+        'task': 'products.tasks.rebuild_brand_aggregates',
+        'schedule': crontab(hour=4, minute=0),
+    },
+}
+# Las tareas de mantenimiento borran en lotes pequeños con una pausa entre
+# lotes para no mantener locks largos ni saturar la base de datos
+MAINTENANCE_BATCH_SIZE = int(os.getenv('MAINTENANCE_BATCH_SIZE', 1000))
+MAINTENANCE_BATCH_PAUSE = float(os.getenv('MAINTENANCE_BATCH_PAUSE', 0.5))
+# Días que se conservan las notificaciones leídas
+NOTIFICATION_RETENTION_DAYS = int(os.getenv('NOTIFICATION_RETENTION_DAYS', 90))
 
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.ClaimsJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.InstrumentedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     )
 }
 
+# IPs o redes (CIDR) de los proxies cuyo X-Real-IP se acepta como IP del cliente;
+# docker-compose fija la IP de nginx
+TRUSTED_PROXIES = os.getenv('TRUSTED_PROXIES', '127.0.0.1').split(',')
+
+# Límites por cliente para los endpoints públicos (core.throttling), por acción:
+# token bucket (rate tokens/s, ráfaga burst) + ventana deslizante (limit por window segundos)
+THROTTLE_TIERS = {
+    'list': {'rate': 2, 'burst': 10, 'limit': 300, 'window': 60},
+    'retrieve': {'rate': 10, 'burst': 50, 'limit': 1200, 'window': 60},
+    'stats': {'rate': 1, 'burst': 5, 'limit': 60, 'window': 60},
+    'view_analytics': {'rate': 1, 'burst': 5, 'limit': 60, 'window': 60},
+    'changes': {'rate': 5, 'burst': 20, 'limit': 600, 'window': 60},
+    'brand_stats': {'rate': 2, 'burst': 10, 'limit': 300, 'window': 60},
+}
+# Los clientes autenticados reciben límites N veces mayores
+THROTTLE_AUTHENTICATED_MULTIPLIER = 5
+# Vistas repetidas del mismo cliente dentro de esta ventana no incrementan los contadores
+VIEW_DEDUP_SECONDS = int(os.getenv('VIEW_DEDUP_SECONDS', 300))
+
+# Días que se conservan los HyperLogLog de visitantes únicos
+UNIQUE_VIEWS_RETENTION_DAYS = int(os.getenv('UNIQUE_VIEWS_RETENTION_DAYS', 31))
+# Horas que se conservan los buckets horarios antes de compactarlos en diarios
+UNIQUE_VIEWS_HOURLY_HOURS = int(os.getenv('UNIQUE_VIEWS_HOURLY_HOURS', 48))
+
+# Métricas e instrumentación (/internal/metrics/)
+METRICS_ALLOWED_IPS = os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1').split(',')
+# Cada cuántos segundos suma cada proceso sus contadores en Redis
+METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', 5))
+# Máximo de consultas SQL por método y endpoint (nombre de la URL), sin contar
+# las de autenticación. products/tests.py recorre todas las entradas
+QUERY_BUDGETS = {
+    'GET product-list': 3,
+    'GET product-detail': 3,
+    'GET product-stats': 6,
+    'GET product-view-analytics': 8,
+    'GET product-changes': 3,
+    'GET product-history': 3,
+    'GET product-brand-history': 3,
+    'GET product-brands': 1,
+    'GET adminuser-list': 2,
+    'POST adminuser-bulk': 3,
+    'GET async-product-list': 2,
+    'GET async-product-detail': 3,
+    'GET async-product-stats': 5,
+    'GET async-product-view-analytics': 5,
+}
+# En modo estricto (siempre durante los tests) exceder el presupuesto lanza una excepción
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', 'False') == 'True' or 'test' in sys.argv[1:2]
+
 # JWT settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
+    'TOKEN_OBTAIN_SERIALIZER': 'core.authentication.ClaimsTokenObtainPairSerializer',
 }
+# Autentica con los claims del token sin consultar custom_user. La invalidación
+# al modificar usuarios se guarda directamente en Redis, fuera de la caché
+JWT_STATELESS_AUTH = os.getenv('JWT_STATELESS_AUTH', 'True') == 'True'
 
 # Custom settings
 SITE_NAME = os.getenv('SITE_NAME', 'ZeBrands Product Catalog')
 
+# Administradores: tamaño de página del listado, máximo por alta masiva y
+# procesos para calcular los hashes de contraseñas
+ADMIN_USERS_PAGE_SIZE = int(os.getenv('ADMIN_USERS_PAGE_SIZE', 50))
+ADMIN_BULK_MAX_USERS = int(os.getenv('ADMIN_BULK_MAX_USERS', 100))
+ADMIN_HASH_WORKERS = int(os.getenv('ADMIN_HASH_WORKERS', 2))
+
+# Feed incremental de cambios (/api/products/changes/)
+PRODUCT_CHANGES_PAGE_SIZE = int(os.getenv('PRODUCT_CHANGES_PAGE_SIZE', 100))
+PRODUCT_CHANGES_MAX_PAGE_SIZE = int(os.getenv('PRODUCT_CHANGES_MAX_PAGE_SIZE', 1000))
+# Margen para no entregar cambios cuyas transacciones aún podrían no estar confirmadas
+PRODUCT_CHANGES_SETTLE_SECONDS = int(os.getenv('PRODUCT_CHANGES_SETTLE_SECONDS', 2))
+# Las entradas reemplazadas por otra posterior del mismo producto se compactan tras N días
+PRODUCT_CHANGES_RETENTION_DAYS = int(os.getenv('PRODUCT_CHANGES_RETENTION_DAYS', 30))
+
+# Historial de cambios de productos: True guarda solo los campos modificados
+PRODUCT_HISTORY_COMPACT = os.getenv('PRODUCT_HISTORY_COMPACT', 'True') == 'True'
+PRODUCT_HISTORY_MAX_ROWS = int(os.getenv('PRODUCT_HISTORY_MAX_ROWS', 5000))
+
 CORS_ALLOW_ALL_ORIGINS = True  # No usar en producción
 
 AUTH_USER_MODEL = 'products.User'  # 'users' es el nombre de tu app
@@ -191,5 +370,13 @@ SWAGGER_SETTINGS = {
     },
     'USE_SESSION_AUTH': False,
     'JSON_EDITOR': True,
-    'DEFAULT_INFO': 'core.urls.swagger_info',  # Ruta a tu configuración
-}
\ No newline at end of file
+    'DEFAULT_INFO': 'core.openapi.API_INFO',
+    # Las interfaces cargan el esquema precalculado (manage.py generate_openapi)
+    'SPEC_URL': 'openapi-schema',
+}
+REDOC_SETTINGS = {
+    'SPEC_URL': 'openapi-schema',
+}
+# Identifica el despliegue; el esquema OpenAPI generado en tiempo de ejecución se cachea por versión
+DEPLOY_VERSION = os.getenv('DEPLOY_VERSION', 'dev')
+OPENAPI_CACHE_SECONDS = int(os.getenv('OPENAPI_CACHE_SECONDS', 300))
\ No newline at end of file
@@ -0,0 +1,63 @@
+"""
+Utilidades para los tests.
+
+Los tests corren sin servicios externos con
+DJANGO_SETTINGS_MODULE=core.loadtest_settings python manage.py test
+(SQLite en archivo); Redis se reemplaza por fakeredis (pip install "fakeredis[lua]").
+"""
+import unittest
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from core import db_router, redis_client
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+class RedisMixin:
+    """Un Redis vacío por test para la caché, el throttle y los contadores"""
+
+    def setUp(self):
+        super().setUp()
+        if fakeredis is None:
+            raise unittest.SkipTest('Los tests que usan Redis necesitan fakeredis: pip install "fakeredis[lua]"')
+        previous = redis_client._pool
+        redis_client._pool = fakeredis.FakeRedis().connection_pool
+        self.addCleanup(setattr, redis_client, '_pool', previous)
+
+
+class RedisTestCase(RedisMixin, TestCase):
+    pass
+
+
+class RedisTransactionTestCase(RedisMixin, TransactionTestCase):
+    """
+    Sin la transacción envolvente de TestCase: los transaction.atomic de las
+    vistas no se vuelven SAVEPOINT y las consultas se cuentan como en producción.
+    """
+
+
+@contextmanager
+def mirror_replica(alias='replica_0'):
+    """
+    Agrega durante el bloque una réplica con TEST['MIRROR'] = 'default', como la
+    que setup_databases configura para cada host de DB_REPLICA_HOSTS. Es otra
+    conexión a la misma base: usar con RedisTransactionTestCase para que vea los datos.
+    """
+    replica = {**connections['default'].settings_dict, 'TEST': {'MIRROR': 'default'}}
+    connections.settings[alias] = replica
+    db_router._replica_health.pop(alias, None)
+    try:
+        with override_settings(DATABASES={**settings.DATABASES, alias: replica}):
+            yield alias
+    finally:
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+        db_router._replica_health.pop(alias, None)
@@ -0,0 +1,271 @@
+import time
+from unittest import mock
+
+import redis
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core import cache as core_cache
+from core import db_router, redis_client
+from core.authentication import ClaimsTokenObtainPairSerializer
+from core.middleware import ReplicaRoutingMiddleware, client_key
+from core.redis_client import get_redis
+from core.testing import RedisTestCase, RedisTransactionTestCase, fakeredis, mirror_replica
+from products import async_views
+from products.models import Product, User
+
+
+class ReplicaRouterTests(RedisTransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.replica = self.enterContext(mirror_replica())
+        self.router = db_router.ReplicaRouter()
+
+    def test_reads_go_to_replica_only_inside_replica_reads(self):
+        self.assertIsNone(self.router.db_for_read(Product))
+        with db_router.replica_reads():
+            self.assertEqual(self.router.db_for_read(Product), self.replica)
+            self.assertEqual(self.router.db_for_write(Product), 'default')
+
+    def test_queries_run_on_the_replica_connection(self):
+        Product.objects.create(sku='SKU-1', name='Producto', price=10, brand='Acme')
+        with CaptureQueriesContext(connections[self.replica]) as replica_queries:
+            with db_router.replica_reads():
+                self.assertEqual(Product.objects.get(sku='SKU-1').name, 'Producto')
+        self.assertEqual(len(replica_queries), 1)
+
+    @override_settings(REPLICA_MAX_LAG_SECONDS=2)
+    def test_lagging_replica_falls_back_to_primary(self):
+        with mock.patch.object(db_router, 'replication_lag', return_value=30.0), \
+                self.assertLogs('core.db_router', 'WARNING'):
+            with db_router.replica_reads():
+                self.assertEqual(self.router.db_for_read(Product), 'default')
+
+
+class ReplicaPinningTests(RedisTransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.replica = self.enterContext(mirror_replica())
+        self.admin = User.objects.create_user('admin', 'admin@example.com', 'clave', role=User.ADMIN)
+        token = ClaimsTokenObtainPairSerializer.get_token(self.admin).access_token
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+    def _replica_queries(self, *args, **kwargs):
+        with CaptureQueriesContext(connections[self.replica]) as queries:
+            response = self.client.get('/api/products/', *args, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_reads_use_replica_until_the_client_writes(self):
+        self.assertGreater(self._replica_queries(**self.auth), 0)
+
+        response = self.client.post(
+            '/api/products/', {'sku': 'SKU-1', 'name': 'Producto', 'price': '10.00', 'brand': 'Acme'},
+            content_type='application/json', **self.auth
+        )
+        self.assertEqual(response.status_code, 201)
+
+        # El mismo cliente lee su escritura de la primaria; los demás siguen en la réplica
+        self.assertEqual(self._replica_queries(**self.auth), 0)
+        self.assertGreater(self._replica_queries(HTTP_X_REAL_IP='10.0.0.2'), 0)
+
+    @override_settings(REPLICA_PIN_SECONDS=0)
+    def test_pin_expires(self):
+        self.client.post(
+            '/api/products/', {'sku': 'SKU-1', 'name': 'Producto', 'price': '10.00', 'brand': 'Acme'},
+            content_type='application/json', **self.auth
+        )
+        self.assertGreater(self._replica_queries(**self.auth), 0)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            ReplicaRoutingMiddleware(lambda request: None)
+
+
+class ClaimsAuthenticationTests(RedisTransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user('admin', 'admin@example.com', 'clave', role=User.ADMIN)
+        token = ClaimsTokenObtainPairSerializer.get_token(self.admin).access_token
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+    def _delete_admin(self):
+        other = User.objects.create_user('otro', 'otro@example.com', 'clave', role=User.ADMIN)
+        other_token = ClaimsTokenObtainPairSerializer.get_token(other).access_token
+        response = self.client.delete(
+            f'/api/admin-users/{self.admin.pk}/', HTTP_AUTHORIZATION=f'Bearer {other_token}'
+        )
+        self.assertEqual(response.status_code, 204)
+
+    @override_settings(JWT_STATELESS_AUTH=True)
+    def test_deleted_admin_token_is_rejected(self):
+        self._delete_admin()
+        self.assertEqual(self.client.get('/api/admin-users/', **self.auth).status_code, 401)
+
+    @override_settings(JWT_STATELESS_AUTH=True)
+    def test_invalidation_survives_cache_clear_and_version_bump(self):
+        self._delete_admin()
+        cache.clear()
+        with override_settings(CACHES={
+            'default': {**settings.CACHES['default'], 'VERSION': settings.CACHES['default'].get('VERSION', 1) + 1}
+        }):
+            self.assertEqual(self.client.get('/api/admin-users/', **self.auth).status_code, 401)
+
+    @override_settings(JWT_STATELESS_AUTH=True)
+    def test_redis_outage_falls_back_to_database_lookup(self):
+        unreachable = redis.ConnectionPool(host='127.0.0.1', port=1, socket_connect_timeout=0.1)
+        with mock.patch.object(redis_client, '_pool', unreachable), self.assertLogs('core', 'WARNING'):
+            response = self.client.post(
+                '/api/products/', {'sku': 'SKU-1', 'name': 'Producto', 'price': '10.00', 'brand': 'Acme'},
+                content_type='application/json', **self.auth
+            )
+        self.assertEqual(response.status_code, 201, response.content[:300])
+
+
+    def test_user_is_not_changed_when_the_marker_cannot_be_written(self):
+        other = User.objects.create_user('otro', 'otro@example.com', 'clave', role=User.ADMIN)
+        unreachable = redis.ConnectionPool(host='127.0.0.1', port=1, socket_connect_timeout=0.1)
+        with mock.patch.object(redis_client, '_pool', unreachable), self.assertLogs('core', 'WARNING'):
+            with self.assertRaises(redis.ConnectionError):
+                self.client.patch(
+                    f'/api/admin-users/{other.pk}/', {'email': 'nuevo@example.com'},
+                    content_type='application/json', **self.auth
+                )
+            with self.assertRaises(redis.ConnectionError):
+                self.client.delete(f'/api/admin-users/{other.pk}/', **self.auth)
+        other.refresh_from_db()
+        self.assertEqual(other.email, 'otro@example.com')
+
+@override_settings(TRUSTED_PROXIES=['172.28.0.10', '10.1.0.0/16'])
+class ClientKeyTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_real_ip_header_from_trusted_proxy_is_used(self):
+        for proxy in ('172.28.0.10', '10.1.2.3'):
+            request = self.factory.get('/', REMOTE_ADDR=proxy, HTTP_X_REAL_IP='203.0.113.7')
+            self.assertEqual(client_key(request), 'ip:203.0.113.7')
+
+    def test_real_ip_header_from_other_clients_is_ignored(self):
+        request = self.factory.get('/', REMOTE_ADDR='198.51.100.4', HTTP_X_REAL_IP='203.0.113.7')
+        self.assertEqual(client_key(request), 'ip:198.51.100.4')
+
+    def test_only_valid_tokens_identify_the_user(self):
+        token = AccessToken()
+        token['user_id'] = 7
+        request = self.factory.get('/', REMOTE_ADDR='198.51.100.4', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(client_key(request), 'user:7')
+        for header in ('Foo 1', 'Bearer basura', f'Foo {token}'):
+            request = self.factory.get('/', REMOTE_ADDR='198.51.100.4', HTTP_AUTHORIZATION=header)
+            self.assertEqual(client_key(request), 'ip:198.51.100.4')
+
+
+@override_settings(
+    TRUSTED_PROXIES=['172.28.0.10'],
+    THROTTLE_TIERS={'list': {'rate': 0.01, 'burst': 2, 'limit': 100, 'window': 60}}
+)
+class ThrottleSpoofingTests(RedisTransactionTestCase):
+    def test_rotating_real_ip_does_not_reset_the_bucket(self):
+        statuses = [
+            self.client.get('/api/products/', REMOTE_ADDR='198.51.100.4', HTTP_X_REAL_IP=f'203.0.113.{i}').status_code
+            for i in range(3)
+        ]
+        self.assertEqual(statuses, [200, 200, 429])
+
+    @override_settings(THROTTLE_TIERS={'retrieve': {'rate': 0.01, 'burst': 2, 'limit': 100, 'window': 60}})
+    def test_rotating_authorization_header_does_not_reset_the_bucket(self):
+        product = Product.objects.create(sku='SKU-1', name='Producto', price=10, brand='Acme')
+        for prefix, header in (('/api', 'Foo {}'), ('/api/async', 'Bearer basura-{}')):
+            with self.subTest(prefix=prefix):
+                get_redis().flushall()
+                statuses = [
+                    async_to_sync(self._get)(f'{prefix}/products/{product.pk}/', header.format(i)).status_code
+                    for i in range(3)
+                ]
+                self.assertEqual(statuses, [200, 200, 429])
+        # Una sola vista por endpoint: las demás son repetidas del mismo cliente
+        product.refresh_from_db()
+        self.assertEqual(product.view_count, 2)
+
+    async def _get(self, url, authorization):
+        # Los conteos asíncronos corren en el event loop de la petición
+        response = await self.async_client.get(url, headers={'Authorization': authorization})
+        await async_views.wait_for_background_tasks()
+        return response
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+class CacheOutageTests(RedisTestCase):
+    def test_public_endpoints_work_without_redis(self):
+        unreachable = redis.ConnectionPool(host='127.0.0.1', port=1, socket_connect_timeout=0.1)
+        with mock.patch.object(redis_client, '_pool', unreachable), self.assertLogs('core', 'WARNING'):
+            for url in ('/api/products/stats/', '/api/async/products/stats/'):
+                with self.subTest(url=url):
+                    self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_failed_operations_are_misses(self):
+        cache.set('clave', 1)
+        unreachable = redis.ConnectionPool(host='127.0.0.1', port=1, socket_connect_timeout=0.1)
+        with mock.patch.object(redis_client, '_pool', unreachable), self.assertLogs('core.cache', 'WARNING'):
+            self.assertIsNone(cache.get('clave'))
+            self.assertEqual(cache.get_many(['clave']), {})
+            self.assertFalse(cache.add('otra', 1))
+            cache.set('clave', 2)
+            cache.delete('clave')
+        self.assertEqual(cache.get('clave'), 1)
+
+
+class TieredCacheTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        # Servidor propio para poder simular la caída de la conexión del hilo de invalidación
+        self.server = fakeredis.FakeServer()
+        redis_client._pool = fakeredis.FakeRedis(server=self.server).connection_pool
+        self.addCleanup(setattr, self.server, 'connected', True)
+        # Cada test arranca un hilo suscrito a su propio Redis
+        self.enterContext(mock.patch.object(core_cache, '_listener_pid', None))
+        self.cache = core_cache.TieredRedisCache(settings.REDIS_URL, {'KEY_PREFIX': 'tiered'})
+        # Escribe en Redis sin pasar por la capa local ni publicar la invalidación
+        self.remote = core_cache.PooledRedisCache(settings.REDIS_URL, {'KEY_PREFIX': 'tiered'})
+        self.local = core_cache._local_cache()
+        self.local.clear()
+        self.key = self.cache.make_and_validate_key('clave')
+
+        self.cache.set('clave', 1)
+        self.assertEqual(self.cache.get('clave'), 1)
+        channel = settings.CACHE_INVALIDATION_CHANNEL
+        self.assertTrue(wait_until(lambda: get_redis().pubsub_numsub(channel)[0][1] > 0))
+
+    def test_reads_are_served_from_the_local_layer(self):
+        self.remote.set('clave', 2)
+        self.assertEqual(self.cache.get('clave'), 1)
+        self.assertEqual(self.cache.get_many(['clave']), {'clave': 1})
+
+    def test_writes_from_other_processes_invalidate_the_local_copy(self):
+        self.remote.set('clave', 2)
+        get_redis().publish(settings.CACHE_INVALIDATION_CHANNEL, self.key)
+        self.assertTrue(wait_until(lambda: self.cache.get('clave') == 2))
+
+    def test_local_layer_is_flushed_after_a_reconnect(self):
+        # Las invalidaciones publicadas mientras el hilo estaba desconectado se pierden
+        with self.assertLogs('core.cache', 'WARNING'):
+            self.server.connected = False
+            self.assertTrue(wait_until(lambda: self.local.get(self.key) is None))
+        self.server.connected = True
+        self.remote.set('clave', 2)
+        self.assertEqual(self.cache.get('clave'), 2)
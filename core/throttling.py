@@ -0,0 +1,128 @@
+"""
+Límite de peticiones por cliente respaldado en Redis.
+
+Un script Lua evalúa en un solo viaje a Redis un token bucket (ráfagas), un
+contador de ventana deslizante (ritmo sostenido) y, opcionalmente, la marca que
+deduplica las vistas repetidas del mismo cliente.
+"""
+import logging
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+from core.middleware import client_ip
+from core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+local window = tonumber(ARGV[4])
+local dedup_ttl = tonumber(ARGV[5])
+
+local window_index = math.floor(now / window)
+local current_key = KEYS[2] .. ':' .. window_index
+local previous_key = KEYS[2] .. ':' .. (window_index - 1)
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local last = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - last) * rate)
+
+local elapsed = (now % window) / window
+local current = tonumber(redis.call('GET', current_key) or '0')
+local previous = tonumber(redis.call('GET', previous_key) or '0')
+local estimated = previous * (1 - elapsed) + current
+
+local allowed = 1
+local wait = 0
+if tokens < 1 then
+    allowed = 0
+    wait = (1 - tokens) / rate
+end
+if estimated >= limit then
+    allowed = 0
+    wait = math.max(wait, window * (1 - elapsed))
+end
+
+local fresh = 0
+if allowed == 1 then
+    tokens = tokens - 1
+    redis.call('INCR', current_key)
+    redis.call('EXPIRE', current_key, window * 2)
+    if KEYS[3] then
+        if redis.call('SET', KEYS[3], 1, 'NX', 'EX', dedup_ttl) then
+            fresh = 1
+        end
+    end
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+
+return {allowed, tostring(wait), fresh}
+"""
+
+_script = None
+
+
+def check_rate(scope, ident, dedup_key=None, authenticated=False):
+    """
+    Consume un token del cliente `ident` en `scope` (clave de THROTTLE_TIERS).
+    Devuelve (permitido, segundos de espera, vista nueva). Si Redis falla se permite.
+    """
+    global _script
+    tier = settings.THROTTLE_TIERS.get(scope)
+    if tier is None:
+        return True, None, True
+    multiplier = settings.THROTTLE_AUTHENTICATED_MULTIPLIER if authenticated else 1
+    keys = [f'throttle:bucket:{scope}:{ident}', f'throttle:window:{scope}:{ident}']
+    if dedup_key:
+        keys.append(f'throttle:seen:{dedup_key}:{ident}')
+
+    try:
+        if _script is None:
+            _script = get_redis().register_script(RATE_LIMIT_SCRIPT)
+        allowed, wait, fresh = _script(keys=keys, args=[
+            tier['rate'] * multiplier,
+            tier['burst'] * multiplier,
+            tier['limit'] * multiplier,
+            tier['window'],
+            settings.VIEW_DEDUP_SECONDS
+        ], client=get_redis())
+    except Exception as e:
+        logger.warning(f"Throttle no disponible, se permite la petición: {str(e)}")
+        return True, None, True
+    return bool(allowed), float(wait), bool(fresh)
+
+
+def request_ident(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}', True
+    return 'ip:' + client_ip(request), False
+
+
+class RedisRateThrottle(BaseThrottle):
+    """
+    Throttle por acción de la vista y por cliente (usuario o IP). Para list y
+    retrieve marca request.is_repeat_view si el cliente ya fue contado en la ventana.
+    """
+    dedup_actions = ('list', 'retrieve')
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'action', None)
+        dedup_key = None
+        if scope in self.dedup_actions:
+            dedup_key = f"product:{view.kwargs.get('pk', 'list')}"
+        ident, authenticated = request_ident(request)
+
+        allowed, self._wait, fresh = check_rate(scope, ident, dedup_key, authenticated)
+        request.is_repeat_view = not fresh
+        return allowed
+
+    def wait(self):
+        return self._wait
@@ -4,33 +4,52 @@ from rest_framework.routers import DefaultRouter
 from products.views import ProductViewSet, AdminUserViewSet
 from rest_framework_simplejwt.views import TokenObtainPairView
 from products.views import AdminRegistrationView
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Product Management API",
-        default_version='v1',
-        description="API para gestión de productos con sistema de notificaciones",
-        terms_of_service="https://www.tudominio.com/terms/",
-        contact=openapi.Contact(email="soporte@tudominio.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+from products import async_views
+from functools import lru_cache
+from core.metrics import metrics_view
+
+
+@lru_cache(maxsize=None)
+def schema_ui(renderer):
+    """
+    Vista de drf_yasg creada en la primera petición: core.openapi importa drf_yasg,
+    que arrastra la maquinaria de esquemas de DRF que los workers no necesitan al arrancar
+    """
+    from core.openapi import schema_view
+    return schema_view.with_ui(renderer, cache_timeout=0)
+
+
+def swagger_ui(request, *args, **kwargs):
+    return schema_ui('swagger')(request, *args, **kwargs)
+
+
+def redoc_ui(request, *args, **kwargs):
+    return schema_ui('redoc')(request, *args, **kwargs)
+
+
+def openapi_schema(request):
+    """Respaldo de /openapi.json cuando nginx no encuentra el archivo precalculado"""
+    from core.openapi import openapi_view
+    return openapi_view(request)
+
 
 router = DefaultRouter()
 router.register(r'products', ProductViewSet)
 router.register(r'admin-users', AdminUserViewSet)
 
 urlpatterns = [
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    path('swagger/', swagger_ui, name='schema-swagger-ui'),
+    path('redoc/', redoc_ui, name='schema-redoc'),
+    path('openapi.json', openapi_schema, name='openapi-schema'),
     path('admin/', admin.site.urls),
+    path('api/async/products/', async_views.product_list, name='async-product-list'),
+    path('api/async/products/stats/', async_views.product_stats, name='async-product-stats'),
+    path('api/async/products/view_analytics/', async_views.product_view_analytics,
+         name='async-product-view-analytics'),
+    path('api/async/products/<int:pk>/', async_views.product_detail, name='async-product-detail'),
     path('api/', include(router.urls)),
     path('api-auth/', include('rest_framework.urls', namespace='rest_framework')),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('register-admin/', AdminRegistrationView.as_view(), name='register-admin'),
+    path('internal/metrics/', metrics_view, name='internal-metrics'),
 ]
\ No newline at end of file
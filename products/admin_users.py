@@ -0,0 +1,67 @@
+"""
+Alta masiva de administradores y versión del listado cacheado de admins.
+
+El hash de contraseñas (PBKDF2 con cientos de miles de iteraciones) se reparte
+en un pool de procesos acotado por ADMIN_HASH_WORKERS: el hilo de gunicorn solo
+espera los resultados y los hashes de un lote se calculan en paralelo.
+"""
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+ADMIN_LIST_VERSION_KEY = 'admin-users:version'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: hacer fork de un worker con hilos puede heredar locks tomados
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.ADMIN_HASH_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup
+            )
+        return _executor
+
+
+def hash_passwords(passwords):
+    """Hashes de make_password calculados en el pool de procesos, en el mismo orden"""
+    if len(passwords) < 2:
+        return [make_password(password) for password in passwords]
+    return list(_get_executor().map(make_password, passwords))
+
+
+def list_version():
+    """
+    Versión actual del listado de admins; forma parte de la clave de cada
+    página. None si la caché no responde: la página se arma sin cachear.
+    """
+    try:
+        return cache.get_or_set(ADMIN_LIST_VERSION_KEY, time.time_ns(), None)
+    except Exception as e:
+        logger.warning(f"No se pudo leer la versión del listado de admins: {str(e)}")
+        return None
+
+
+def bump_list_version():
+    """
+    Invalida todas las páginas cacheadas del listado de admins. Si la caché no
+    responde, las páginas viejas expiran solas tras CACHE_TTLS['admin_users'].
+    """
+    try:
+        cache.set(ADMIN_LIST_VERSION_KEY, time.time_ns(), None)
+    except Exception as e:
+        logger.warning(f"No se pudo invalidar el listado de admins: {str(e)}")
@@ -0,0 +1,180 @@
+"""
+Variantes asíncronas (ASGI) de los endpoints públicos de lectura de productos.
+
+Usan el ORM y la caché asíncronos de Django; el conteo de vistas se lanza como
+tarea en segundo plano para no retrasar la respuesta.
+"""
+import asyncio
+import functools
+import logging
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, F, Sum
+from django.http import HttpResponseNotAllowed, JsonResponse
+from django.utils import timezone
+
+from core.middleware import client_key, token_user_id
+from core.throttling import check_rate
+
+from . import brands
+from .models import Product
+from .serializers import ProductSerializer
+from .unique_views import ALL_PRODUCTS, fingerprint, record_view, unique_viewers
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_RANGES = {
+    '24h': timedelta(hours=24),
+    '7d': timedelta(days=7),
+    '30d': timedelta(days=30),
+}
+
+# Referencias a las tareas en curso para que no las recolecte el GC
+_background_tasks = set()
+
+
+def public_endpoint(scope, dedup=False):
+    """
+    require_GET (el de Django 4.2 no soporta vistas asíncronas) más el throttle
+    de core.throttling. Con `dedup`, marca request.is_repeat_view como la API síncrona.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return HttpResponseNotAllowed(['GET', 'HEAD'])
+
+            dedup_key = f"product:{kwargs.get('pk', 'list')}" if dedup else None
+            allowed, wait, fresh = await sync_to_async(check_rate)(
+                scope, client_key(request), dedup_key, not _is_anonymous(request)
+            )
+            if not allowed:
+                response = JsonResponse({'detail': 'Demasiadas peticiones.'}, status=429)
+                response['Retry-After'] = str(int(wait or 1) + 1)
+                return response
+            request.is_repeat_view = not fresh
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _fire_and_forget(coroutine):
+    task = asyncio.create_task(coroutine)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def wait_for_background_tasks():
+    """Espera los conteos pendientes (benchmarks y tests)"""
+    if _background_tasks:
+        await asyncio.gather(*_background_tasks, return_exceptions=True)
+
+
+def _is_anonymous(request):
+    """Misma regla que la API síncrona: solo cuentan las vistas sin un JWT válido"""
+    return token_user_id(request) is None
+
+
+async def _increment_view_count(product_id):
+    try:
+        await Product.objects.filter(pk=product_id).aupdate(
+            view_count=F('view_count') + 1,
+            last_viewed=timezone.now()
+        )
+    except Exception as e:
+        logger.error(f"Error incrementing view count: {str(e)}",
+                     exc_info=True, extra={'product_id': product_id})
+
+
+async def _increment_list_view_count():
+    try:
+        await Product.objects.aupdate(list_view_count=F('list_view_count') + 1)
+    except Exception as e:
+        logger.error(f"Error incrementing list view count: {str(e)}", exc_info=True)
+
+
+async def _serialize(queryset):
+    return ProductSerializer([product async for product in queryset], many=True).data
+
+
+@public_endpoint('list', dedup=True)
+async def product_list(request):
+    if _is_anonymous(request) and not request.is_repeat_view:
+        _fire_and_forget(_increment_list_view_count())
+    return JsonResponse(await _serialize(Product.objects.all()), safe=False)
+
+
+@public_endpoint('retrieve', dedup=True)
+async def product_detail(request, pk):
+    product = await Product.objects.filter(pk=pk).afirst()
+    if product is None:
+        return JsonResponse({'detail': 'No encontrado.'}, status=404)
+    if _is_anonymous(request) and not request.is_repeat_view:
+        _fire_and_forget(_increment_view_count(product.pk))
+        _fire_and_forget(sync_to_async(record_view)(product.pk, fingerprint(request)))
+        _fire_and_forget(sync_to_async(brands.record_view)(product.pk))
+    return JsonResponse(ProductSerializer(product).data)
+
+
+@public_endpoint('stats')
+async def product_stats(request):
+    """Estadísticas básicas de productos, cacheadas (compartidas con la API síncrona)"""
+    stats = await cache.aget('products:stats')
+    if stats is None:
+        totals = await Product.objects.aaggregate(
+            total_views=Sum('view_count'),
+            total_list_views=Sum('list_view_count')
+        )
+        stats = {
+            'total_products': await Product.objects.acount(),
+            'total_views': totals['total_views'] or 0,
+            'total_list_views': totals['total_list_views'] or 0,
+            'most_viewed': await _serialize(Product.objects.order_by('-view_count')[:5]),
+            'recently_updated': await _serialize(Product.objects.order_by('-updated_at')[:5])
+        }
+        await cache.aset('products:stats', stats, settings.CACHE_TTLS['product_stats'])
+    return JsonResponse(stats)
+
+
+@public_endpoint('view_analytics')
+async def product_view_analytics(request):
+    """Analíticas de visualizaciones, cacheadas por rango"""
+    time_range = request.GET.get('range', '7d')
+    if time_range not in ANALYTICS_RANGES:
+        time_range = '7d'
+    cache_key = f'products:view-analytics:{time_range}'
+
+    analytics = await cache.aget(cache_key)
+    if analytics is None:
+        delta = ANALYTICS_RANGES[time_range]
+        now = timezone.now()
+        cutoff_date = now - delta
+        viewed = Product.objects.filter(last_viewed__gte=cutoff_date)
+        metrics = await viewed.aaggregate(total_views=Sum('view_count'), views_per_product=Avg('view_count'))
+        trending_products = await _serialize(viewed.order_by('-view_count')[:5])
+        uniques = await sync_to_async(unique_viewers)([product['id'] for product in trending_products], delta)
+        for product in trending_products:
+            product['unique_viewers'] = uniques.get(product['id'], 0)
+
+        analytics = {
+            'period': str(delta),
+            'start_date': cutoff_date,
+            'end_date': now,
+            'metrics': {
+                'total_views': metrics['total_views'] or 0,
+                'unique_products_viewed': await viewed.acount(),
+                'views_per_product': metrics['views_per_product'] or 0,
+                'unique_viewers': uniques.get(ALL_PRODUCTS, 0)
+            },
+            'product_views': [
+                row async for row in viewed.values('id', 'sku', 'name', 'last_viewed').annotate(
+                    views=F('view_count')
+                ).order_by('-views')
+            ],
+            'trending_products': trending_products
+        }
+        await cache.aset(cache_key, analytics, settings.CACHE_TTLS['view_analytics'])
+    return JsonResponse(analytics)
@@ -0,0 +1,320 @@
+"""
+Utilidades compartidas por los comandos de benchmark y load test: base de datos
+aislada, sustitutos de core.loadtest_settings, carga de datos de prueba,
+ejecución concurrente, resumen de latencias, cola de tareas en proceso y
+muestreo periódico.
+"""
+import asyncio
+import json
+import logging
+import random
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+)
+from django.utils import timezone
+
+from core import redis_client
+
+from . import brands
+from .models import Product, ProductChange, User
+
+logger = logging.getLogger(__name__)
+
+BRANDS = ['ZeBrands', 'Acme', 'Globex', 'Initech', 'Umbrella', 'Hooli', 'Stark', 'Wayne']
+BATCH_SIZE = 1000
+
+
+def use_stand_ins():
+    """
+    Con core.loadtest_settings (LOADTEST_STAND_INS) reemplaza Redis por
+    fakeredis en el pool del proceso. Devuelve si se usan los sustitutos.
+    """
+    if not getattr(settings, 'LOADTEST_STAND_INS', False):
+        return False
+    try:
+        import fakeredis
+    except ImportError:
+        raise CommandError('core.loadtest_settings necesita fakeredis: pip install "fakeredis[lua]"')
+    # Caché, throttle, métricas y vistas únicas toman sus conexiones de este pool
+    redis_client._pool = fakeredis.FakeRedis().connection_pool
+    return True
+
+
+@contextmanager
+def isolated_database(keepdb=False):
+    """
+    Crea bases de datos de prueba (como el test runner) para no tocar datos reales.
+    Las tablas se crean desde los modelos, sin aplicar migraciones.
+    """
+    setup_test_environment()
+    for alias in connections:
+        connections[alias].settings_dict['TEST']['MIGRATE'] = False
+    # setup_databases también resuelve las réplicas declaradas con TEST['MIRROR']
+    old_config = setup_databases(verbosity=0, interactive=False, keepdb=keepdb, serialized_aliases=[])
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0, keepdb=keepdb)
+        teardown_test_environment()
+
+
+def seed(products, admins):
+    """Carga N productos y M administradores con bulk_create"""
+    password = make_password('benchmark-password')
+    User.objects.bulk_create([
+        User(
+            username=f'bench-admin-{i}',
+            email=f'bench-admin-{i}@example.com',
+            password=password,
+            role=User.ADMIN,
+            is_staff=True
+        )
+        for i in range(admins)
+    ])
+
+    rng = random.Random(42)
+    now = timezone.now()
+    for start in range(0, products, BATCH_SIZE):
+        created = Product.objects.bulk_create([
+            Product(
+                sku=f'BENCH-{i:08d}',
+                name=f'Producto {i}',
+                price=Decimal(rng.randint(100, 100000)) / 100,
+                brand=rng.choice(BRANDS),
+                view_count=rng.randint(0, 5000),
+                list_view_count=rng.randint(0, 500),
+                last_viewed=now - timedelta(minutes=rng.randint(0, 60 * 24 * 30))
+            )
+            for i in range(start, min(start + BATCH_SIZE, products))
+        ])
+        # bulk_create no envía señales: el feed de cambios se llena aquí
+        ProductChange.objects.bulk_create([
+            ProductChange(product_id=product.pk, sku=product.sku, action=ProductChange.UPSERT)
+            for product in created
+        ])
+    # y los agregados por marca se calculan al final
+    brands.rebuild()
+    return list(Product.objects.values_list('id', flat=True))
+
+
+def summarize(latencies, elapsed, errors=0):
+    """Resume latencias (en segundos) en percentiles en milisegundos y throughput"""
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        if not ordered:
+            return 0.0
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return round(ordered[index] * 1000, 3)
+
+    return {
+        'count': len(ordered),
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(statistics.mean(ordered) * 1000, 3) if ordered else 0.0,
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'p99_ms': percentile(99),
+        'max_ms': round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+
+def run_concurrent(call, total, concurrency):
+    """
+    Ejecuta `call(worker_index, iteration)` `total` veces repartidas entre hilos.
+    `call` devuelve True si la operación fue exitosa.
+    """
+    def worker(index, iterations):
+        latencies, errors = [], 0
+        try:
+            for iteration in range(iterations):
+                started = time.perf_counter()
+                ok = call(index, iteration)
+                latencies.append(time.perf_counter() - started)
+                if not ok:
+                    errors += 1
+        finally:
+            connection.close()
+        return latencies, errors
+
+    shares = [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(worker, range(concurrency), shares))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for result, _ in outcomes for latency in result]
+    return summarize(latencies, elapsed, sum(errors for _, errors in outcomes))
+
+
+def run_concurrent_async(call, total, concurrency, finalize=None):
+    """
+    Equivalente asíncrono de run_concurrent: `concurrency` corrutinas en un solo
+    event loop. `finalize` (async) se espera antes de cerrar el loop.
+    """
+    async def worker(iterations, index):
+        latencies, errors = [], 0
+        for iteration in range(iterations):
+            started = time.perf_counter()
+            ok = await call(index, iteration)
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors += 1
+        return latencies, errors
+
+    async def main():
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(*(
+            worker(total // concurrency + (1 if i < total % concurrency else 0), i)
+            for i in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+        if finalize:
+            await finalize()
+        return outcomes, elapsed
+
+    outcomes, elapsed = asyncio.run(main())
+    latencies = [latency for result, _ in outcomes for latency in result]
+    return summarize(latencies, elapsed, sum(errors for _, errors in outcomes))
+
+
+class InProcessQueue:
+    """
+    Sustituto del broker de Celery: delay()/apply_async() de las tareas
+    parcheadas encolan en un pool de `concurrency` hilos que las ejecutan con
+    apply(), como haría un worker con esa concurrencia.
+    """
+    def __init__(self, concurrency):
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._lock = threading.Lock()
+        self.depth = 0
+        self.completed = 0
+        self.failed = 0
+        self.latencies = []  # De encolada a terminada
+
+    def _run(self, task, args, kwargs, enqueued):
+        with self._lock:
+            self.depth -= 1
+        try:
+            failed = task.apply(args=args, kwargs=kwargs).failed()
+        except Exception:
+            logger.exception(f'La tarea {task.name} falló')
+            failed = True
+        finally:
+            connection.close()
+        with self._lock:
+            self.completed += 1
+            self.failed += failed
+            self.latencies.append(time.perf_counter() - enqueued)
+
+    def _enqueue(self, task):
+        def apply_async(args=None, kwargs=None, **options):
+            with self._lock:
+                self.depth += 1
+            self._executor.submit(self._run, task, args or (), kwargs or {}, time.perf_counter())
+        return apply_async
+
+    @contextmanager
+    def patch(self, *tasks):
+        with ExitStack() as stack:
+            for task in tasks:
+                stack.enter_context(mock.patch.object(task, 'apply_async', self._enqueue(task)))
+            yield self
+
+    def drain(self):
+        """Espera a que terminen las tareas encoladas"""
+        self._executor.shutdown(wait=True)
+
+
+class Sampler(threading.Thread):
+    """Llama cada `interval` segundos a cada sonda de `probes` y guarda sus valores"""
+
+    def __init__(self, probes, interval):
+        super().__init__(daemon=True)
+        self.probes = probes
+        self.interval = interval
+        self.samples = {name: [] for name in probes}
+        self._stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self._stopped.wait(self.interval):
+                for name, probe in self.probes.items():
+                    try:
+                        self.samples[name].append(probe())
+                    except Exception as e:
+                        logger.warning(f'Sonda {name} falló: {str(e)}')
+        finally:
+            connection.close()
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def summary(self):
+        return {
+            name: {
+                'samples': len(values),
+                'max': max(values, default=0),
+                'mean': round(statistics.mean(values), 2) if values else 0.0,
+                'last': values[-1] if values else 0,
+            }
+            for name, values in self.samples.items()
+        }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path, meta, results):
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': timezone.now().isoformat(),
+            'database': connection.vendor,
+            **meta,
+        },
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def compare(previous_path, results):
+    """Variación porcentual de p95 y throughput frente a un reporte anterior"""
+    with open(previous_path) as f:
+        previous = json.load(f)['results']
+
+    deltas = {}
+    for name, current in results.items():
+        before = previous.get(name)
+        if not before:
+            continue
+        deltas[name] = {
+            metric: round((current[metric] - before[metric]) / before[metric] * 100, 1)
+            for metric in ('p95_ms', 'throughput_rps')
+            if before.get(metric) and metric in current
+        }
+    return deltas
@@ -0,0 +1,174 @@
+"""
+Agregados por marca (productos, precio mínimo/promedio/máximo y vistas totales)
+mantenidos de forma incremental en la tabla Brand.
+
+- Altas, ediciones y bajas de productos (products.signals) aplican un UPDATE con
+  deltas F() sobre la fila de la marca, calculados contra los valores leídos de
+  la base (Product.from_db). El mínimo y el máximo se recalculan en la misma
+  sentencia con el índice (brand_ref, price).
+- Las vistas se acumulan por producto en un hash de Redis y flush_views las
+  aplica en lote, para no escribir la fila de la marca en cada petición. El
+  view_count del producto ya las incluye: al borrarlo o cambiarlo de marca se
+  retiran sus vistas pendientes del hash para no restarlas de una marca que
+  todavía no las sumó.
+- rebuild recalcula todo desde cero: sirve para datos cargados con bulk_create
+  y corrige cualquier deriva de los deltas.
+"""
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Greatest
+from redis.exceptions import ResponseError
+
+from core.redis_client import get_redis
+
+from .models import Brand, Product
+
+logger = logging.getLogger(__name__)
+
+PENDING_VIEWS_KEY = 'brand-views:pending'
+FLUSHING_VIEWS_KEY = 'brand-views:flushing'
+
+
+def get_brand(name):
+    return Brand.objects.get_or_create(name=name)[0]
+
+
+def _apply(brand_id, count=0, price=Decimal('0'), views=0):
+    products = Product.objects.filter(brand_ref=OuterRef('pk'))
+    Brand.objects.filter(pk=brand_id).update(
+        product_count=F('product_count') + count,
+        price_sum=F('price_sum') + price,
+        # El piso en 0 cubre deltas calculados sin poder leer las vistas pendientes
+        total_views=Greatest(F('total_views') + views, 0),
+        min_price=Subquery(products.order_by('price').values('price')[:1]),
+        max_price=Subquery(products.order_by('-price').values('price')[:1]),
+    )
+
+
+def _take_pending_views(product_id):
+    """Quita del hash las vistas pendientes del producto y devuelve cuántas eran"""
+    try:
+        pipe = get_redis().pipeline()
+        for key in (PENDING_VIEWS_KEY, FLUSHING_VIEWS_KEY):
+            pipe.hget(key, product_id)
+            pipe.hdel(key, product_id)
+        pending, _, flushing, _ = pipe.execute()
+    except Exception as e:
+        logger.warning(f"No se pudieron leer las vistas pendientes del producto: {str(e)}")
+        return 0
+    return int(pending or 0) + int(flushing or 0)
+
+
+def product_saved(product, created):
+    """Aplica a las marcas el alta o la edición de `product`"""
+    loaded = {} if created else getattr(product, '_loaded', {})
+    old_brand = loaded.get('brand_ref_id')
+    old_price = Decimal(str(loaded.get('price', product.price)))
+    old_views = loaded.get('view_count', product.view_count)
+    price = Decimal(str(product.price))
+
+    if old_brand == product.brand_ref_id:
+        if price != old_price or product.view_count != old_views:
+            _apply(product.brand_ref_id, price=price - old_price, views=product.view_count - old_views)
+    else:
+        # Cambio de marca: se actualizan ambas en orden de pk para evitar deadlocks
+        deltas = {product.brand_ref_id: (1, price, product.view_count)}
+        if old_brand is not None:
+            # La marca nueva recibe el view_count completo, con las vistas que estaban pendientes
+            deltas[old_brand] = (-1, -old_price, -(old_views - _take_pending_views(product.pk)))
+        for brand_id in sorted(deltas):
+            count, price_delta, views_delta = deltas[brand_id]
+            _apply(brand_id, count, price_delta, views_delta)
+    product.snapshot_loaded()
+
+
+def product_deleted(product):
+    if product.brand_ref_id is not None:
+        views = product.view_count - _take_pending_views(product.pk)
+        _apply(product.brand_ref_id, -1, -Decimal(str(product.price)), -views)
+
+
+def record_view(product_id):
+    """Acumula una vista del producto para el próximo flush"""
+    try:
+        get_redis().hincrby(PENDING_VIEWS_KEY, product_id, 1)
+    except Exception as e:
+        logger.warning(f"No se pudo registrar la vista para la marca: {str(e)}")
+
+
+def flush_views():
+    """
+    Suma a cada marca las vistas acumuladas de sus productos. El hash se
+    renombra antes de leerlo para que las vistas nuevas vayan al siguiente lote;
+    un lote que quedó a medias se reintenta primero. Devuelve las vistas aplicadas.
+    """
+    redis = get_redis()
+    if not redis.exists(FLUSHING_VIEWS_KEY):
+        try:
+            redis.rename(PENDING_VIEWS_KEY, FLUSHING_VIEWS_KEY)
+        except ResponseError:
+            return 0  # No hay vistas pendientes
+
+    counts = {}
+    for product_id, views in redis.hgetall(FLUSHING_VIEWS_KEY).items():
+        try:
+            counts[int(product_id)] = int(views)
+        except ValueError:
+            # Un campo inválido no debe bloquear el lote: el hash se borra al final
+            logger.warning(f"Vistas pendientes inválidas descartadas: {product_id!r}={views!r}")
+    brand_of = dict(Product.objects.filter(pk__in=counts).values_list('pk', 'brand_ref_id'))
+    per_brand = defaultdict(int)
+    for product_id, views in counts.items():
+        # Las vistas de productos ya borrados no se suman (su view_count se restó al borrarlos)
+        if brand_of.get(product_id) is not None:
+            per_brand[brand_of[product_id]] += views
+
+    with transaction.atomic():
+        for brand_id in sorted(per_brand):
+            Brand.objects.filter(pk=brand_id).update(total_views=F('total_views') + per_brand[brand_id])
+    redis.delete(FLUSHING_VIEWS_KEY)
+    return sum(per_brand.values())
+
+
+def rebuild():
+    """Recalcula marcas y agregados desde Product; devuelve cuántas marcas actualizó"""
+    names = Product.objects.values_list('brand', flat=True).distinct()
+    Brand.objects.bulk_create([Brand(name=name) for name in names], ignore_conflicts=True)
+    Product.objects.exclude(brand_ref__name=F('brand')).update(
+        brand_ref=Subquery(Brand.objects.filter(name=OuterRef('brand')).values('pk')[:1])
+    )
+
+    brands = Brand.objects.in_bulk()
+    for brand in brands.values():
+        brand.product_count, brand.price_sum, brand.total_views = 0, 0, 0
+        brand.min_price = brand.max_price = None
+    rows = list(Product.objects.values('brand_ref').annotate(
+        count=Count('id'), total=Sum('price'), low=Min('price'), high=Max('price'), views=Sum('view_count')
+    ))
+
+    # Los view_count leídos ya incluyen las vistas pendientes de flush. El hash
+    # se descarta después de leerlos y no antes: una vista registrada durante la
+    # agregación quedaría en la suma y en el hash. Las posteriores al DELETE
+    # van al próximo flush
+    try:
+        get_redis().delete(PENDING_VIEWS_KEY, FLUSHING_VIEWS_KEY)
+    except Exception as e:
+        logger.warning(f"No se pudieron descartar las vistas pendientes: {str(e)}")
+
+    for row in rows:
+        brand = brands[row['brand_ref']]
+        brand.product_count = row['count']
+        brand.price_sum = row['total']
+        brand.min_price = row['low']
+        brand.max_price = row['high']
+        brand.total_views = row['views']
+    Brand.objects.bulk_update(
+        brands.values(),
+        ['product_count', 'price_sum', 'min_price', 'max_price', 'total_views'],
+        batch_size=1000
+    )
+    return len(brands)
@@ -0,0 +1,36 @@
+"""
+Escritura del historial de cambios de productos (ProductHistory).
+"""
+from django.conf import settings
+
+from .models import ProductHistory
+
+SIGNIFICANT_FIELDS = ['price', 'name', 'brand', 'sku']
+
+
+def build_entry(product, changes, user=None):
+    """
+    Crea (sin guardar) la fila de historial de un producto. En modo compacto
+    solo se guardan los campos que cambiaron; si no, también una foto completa.
+    """
+    payload = dict(changes)
+    if not settings.PRODUCT_HISTORY_COMPACT:
+        payload['snapshot'] = {field: getattr(product, field) for field in SIGNIFICANT_FIELDS}
+
+    price = changes.get('price', {})
+    return ProductHistory(
+        product_id=product.pk,
+        brand=product.brand,
+        changed_by=user,
+        old_price=price.get('old'),
+        new_price=price.get('new'),
+        changes=payload
+    )
+
+
+def record_changes(entries):
+    """Inserta el historial de uno o varios productos en un solo INSERT"""
+    entries = [entry for entry in entries if entry.changes]
+    if entries:
+        ProductHistory.objects.bulk_create(entries, batch_size=1000)
+    return entries
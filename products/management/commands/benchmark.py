@@ -0,0 +1,170 @@
+import random
+import time
+
+from django.core import mail
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+
+from core import metrics
+from products import async_views, bench
+from products.models import User
+from products.tasks import send_product_update_notification
+
+READ_SCENARIOS = {
+    'list': lambda ids, rng: '/api/products/',
+    'retrieve': lambda ids, rng: f'/api/products/{rng.choice(ids)}/',
+    'stats': lambda ids, rng: '/api/products/stats/',
+    'view_analytics': lambda ids, rng: f"/api/products/view_analytics/?range={rng.choice(['24h', '7d', '30d'])}",
+}
+# Los mismos escenarios contra los endpoints ASGI, para comparar con WSGI
+ASYNC_SCENARIOS = {
+    f'async_{name}': (lambda build: lambda ids, rng: build(ids, rng).replace('/api/', '/api/async/', 1))(build)
+    for name, build in READ_SCENARIOS.items()
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark reproducible de la API de productos y del pipeline de notificaciones. '
+        'Con DJANGO_SETTINGS_MODULE=core.loadtest_settings usa SQLite y fakeredis, como loadtest.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--admins', type=int, default=5)
+        parser.add_argument('--requests', type=int, default=200, help='Peticiones por escenario')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--notifications', type=int, default=50, help='Tareas de notificación a ejecutar')
+        parser.add_argument('--scenarios', default=','.join([*READ_SCENARIOS, *ASYNC_SCENARIOS, 'notifications', 'connections']))
+        parser.add_argument('--output', default='benchmark-results.json')
+        parser.add_argument('--compare', help='Reporte JSON anterior contra el cual comparar')
+
+    def handle(self, *args, **options):
+        scenarios = options['scenarios'].split(',')
+        results = {}
+        stand_ins = bench.use_stand_ins()
+
+        # Todos los clientes del benchmark comparten IP: sin throttle ni deduplicación
+        with bench.isolated_database(), override_settings(THROTTLE_TIERS={}):
+            started = time.perf_counter()
+            product_ids = bench.seed(options['products'], options['admins'])
+            self.stdout.write(
+                f"Datos cargados: {len(product_ids)} productos, {options['admins']} admins "
+                f"en {time.perf_counter() - started:.1f}s"
+            )
+
+            for name in scenarios:
+                if name in READ_SCENARIOS:
+                    results[name] = self._run_read(name, product_ids, options)
+                elif name in ASYNC_SCENARIOS:
+                    results[name] = self._run_async_read(name, product_ids, options)
+                elif name == 'notifications':
+                    results[name] = self._run_notifications(options)
+                elif name == 'connections':
+                    results[name] = self._run_connections(product_ids, options)
+                else:
+                    self.stderr.write(f'Escenario desconocido: {name}')
+                    continue
+                self.stdout.write(f'{name}: {results[name]}')
+
+        bench.write_results(options['output'], {
+            'products': options['products'],
+            'admins': options['admins'],
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'stand_ins': stand_ins,
+        }, results)
+        self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['output']}"))
+
+        if options['compare']:
+            for name, delta in bench.compare(options['compare'], results).items():
+                self.stdout.write(f'{name}: variación % {delta}')
+
+    def _run_read(self, name, product_ids, options):
+        build_url = READ_SCENARIOS[name]
+        clients = [Client(raise_request_exception=False) for _ in range(options['concurrency'])]
+        rngs = [random.Random(index) for index in range(options['concurrency'])]
+
+        # Consultas SQL de una petición representativa
+        stats = metrics.new_stats()
+        with metrics.collect(stats):
+            Client(raise_request_exception=False).get(build_url(product_ids, random.Random(0)))
+
+        def call(index, iteration):
+            response = clients[index].get(build_url(product_ids, rngs[index]))
+            return response.status_code == 200
+
+        summary = bench.run_concurrent(call, options['requests'], options['concurrency'])
+        summary['queries_per_request'] = stats['queries']
+        return summary
+
+    def _run_async_read(self, name, product_ids, options):
+        build_url = ASYNC_SCENARIOS[name]
+        clients = [AsyncClient(raise_request_exception=False) for _ in range(options['concurrency'])]
+        rngs = [random.Random(index) for index in range(options['concurrency'])]
+
+        async def call(index, iteration):
+            response = await clients[index].get(build_url(product_ids, rngs[index]))
+            return response.status_code == 200
+
+        return bench.run_concurrent_async(
+            call, options['requests'], options['concurrency'],
+            finalize=async_views.wait_for_background_tasks
+        )
+
+    def _run_notifications(self, options):
+        """Throughput de send_product_update_notification con correo en memoria"""
+        admins = list(User.objects.filter(role=User.ADMIN).values_list('id', flat=True))
+        if not admins:
+            return {}
+        product_data = {
+            'id': 1,
+            'name': 'Producto 1',
+            'sku': 'BENCH-00000001',
+            'brand': 'ZeBrands',
+            'updated_at': '2025-01-01 00:00:00'
+        }
+        changes = {'price': {'old': '10.00', 'new': '12.50'}}
+        mail.outbox = []
+
+        latencies = []
+        started = time.perf_counter()
+        for i in range(options['notifications']):
+            task_started = time.perf_counter()
+            # apply() ejecuta la tarea en el proceso actual, sin broker
+            send_product_update_notification.apply(kwargs={
+                'product_data': product_data,
+                'changes': changes,
+                'updated_by_id': admins[i % len(admins)]
+            })
+            latencies.append(time.perf_counter() - task_started)
+        elapsed = time.perf_counter() - started
+
+        summary = bench.summarize(latencies, elapsed)
+        summary['emails_sent'] = len(mail.outbox)
+        summary['emails_per_s'] = round(len(mail.outbox) / elapsed, 2) if elapsed else 0.0
+        return summary
+
+    def _run_connections(self, product_ids, options):
+        """Costo de abrir una conexión por petición (CONN_MAX_AGE=0) frente a reutilizarla"""
+        client = Client(raise_request_exception=False)
+        rng = random.Random(0)
+        results = {}
+        for mode in ('per_request', 'persistent'):
+            latencies = []
+            started = time.perf_counter()
+            for _ in range(options['requests']):
+                request_started = time.perf_counter()
+                client.get(f'/api/products/{rng.choice(product_ids)}/')
+                if mode == 'per_request':
+                    # Lo que hace close_old_connections al terminar la petición con CONN_MAX_AGE=0
+                    connection.close()
+                latencies.append(time.perf_counter() - request_started)
+            results[mode] = bench.summarize(latencies, time.perf_counter() - started)
+
+        results['overhead_per_request_ms'] = round(
+            results['per_request']['mean_ms'] - results['persistent']['mean_ms'], 3
+        )
+        return results
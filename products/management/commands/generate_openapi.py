@@ -0,0 +1,27 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from core.openapi import generate_schema, schema_path
+
+
+class Command(BaseCommand):
+    help = 'Genera el esquema OpenAPI en STATIC_ROOT/openapi.json para servirlo como archivo estático'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Ruta de salida (por defecto STATIC_ROOT/openapi.json)')
+
+    def handle(self, *args, **options):
+        path = Path(options['output']) if options['output'] else schema_path()
+        started = time.perf_counter()
+        schema = generate_schema()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Se escribe aparte y se renombra para que nginx nunca sirva un archivo a medias
+        tmp_path = path.with_suffix('.json.tmp')
+        tmp_path.write_bytes(schema)
+        tmp_path.replace(path)
+        self.stdout.write(self.style.SUCCESS(
+            f'Esquema OpenAPI ({len(schema) / 1024:.1f} KB) generado en '
+            f'{time.perf_counter() - started:.2f}s: {path}'
+        ))
@@ -0,0 +1,254 @@
+import random
+import sys
+import time
+from collections import defaultdict
+
+from django.core import mail
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import got_request_exception
+from django.db import OperationalError, connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from core.authentication import ClaimsTokenObtainPairSerializer
+from core.celery import app as celery_app
+from products import bench
+from products.models import User
+from products.tasks import send_product_update_notification
+
+# Peticiones de la mezcla de tráfico: (método, url, datos) a partir de los ids cargados
+OPERATIONS = {
+    'list': lambda ids, rng: ('get', f'/api/products/?page={rng.randint(1, 5)}', None),
+    'retrieve': lambda ids, rng: ('get', f'/api/products/{rng.choice(ids)}/', None),
+    # Cambia el precio: registra el historial y encola send_product_update_notification
+    'update': lambda ids, rng: (
+        'patch', f'/api/products/{rng.choice(ids)}/', {'price': f'{rng.randint(100, 100000) / 100:.2f}'}
+    ),
+    'stats': lambda ids, rng: ('get', '/api/products/stats/', None),
+    'view_analytics': lambda ids, rng: (
+        'get', f"/api/products/view_analytics/?range={rng.choice(['24h', '7d', '30d'])}", None
+    ),
+}
+DEFAULT_MIX = 'list=40,retrieve=40,update=5,stats=10,view_analytics=5'
+# Operaciones que hace un admin autenticado; el resto son anónimas
+ADMIN_OPERATIONS = {'update'}
+
+
+def parse_mix(value):
+    """'list=40,retrieve=60' -> {'list': 40.0, 'retrieve': 60.0}"""
+    mix = {}
+    for item in filter(None, value.split(',')):
+        name, _, weight = item.partition('=')
+        if name not in OPERATIONS:
+            raise CommandError(f'Operación desconocida en --mix: {name} (disponibles: {", ".join(OPERATIONS)})')
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise CommandError(f'Peso inválido en --mix: {item}')
+    if not mix or sum(mix.values()) <= 0:
+        raise CommandError('--mix debe tener al menos una operación con peso positivo')
+    return mix
+
+
+def lock_waits_probe():
+    """Sesiones esperando un lock en la base actual (solo PostgreSQL)"""
+    if connection.vendor != 'postgresql':
+        return None
+
+    def probe():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM pg_stat_activity "
+                "WHERE datname = current_database() AND wait_event_type = 'Lock'"
+            )
+            return cursor.fetchone()[0]
+    return probe
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test con una mezcla de tráfico realista sobre el stack completo de Django '
+        '(middleware, throttle, caché, base de datos y Celery). Reporta p50/p95/p99, '
+        'throughput, esperas por locks de la base y profundidad de la cola de Celery. '
+        'Con DJANGO_SETTINGS_MODULE=core.loadtest_settings usa SQLite, fakeredis y una '
+        'cola en proceso; con core.settings usa PostgreSQL, Redis y el broker reales, y '
+        'las notificaciones las procesa un worker apuntando a la base de prueba '
+        '(DB_NAME=test_<DB_NAME>).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Pesos por operación (por defecto {DEFAULT_MIX})')
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--admins', type=int, default=5)
+        parser.add_argument('--requests', type=int, default=2000, help='Peticiones totales')
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help='Peticiones simultáneas (workers x threads de gunicorn)'
+        )
+        parser.add_argument(
+            '--celery-concurrency', type=int, default=4,
+            help='Hilos de la cola en proceso (solo con core.loadtest_settings)'
+        )
+        parser.add_argument('--clients', type=int, default=500, help='IPs distintas de los clientes anónimos')
+        parser.add_argument('--no-throttle', action='store_true', help='Desactiva THROTTLE_TIERS')
+        parser.add_argument('--sample-interval', type=float, default=0.25, help='Segundos entre muestras')
+        parser.add_argument(
+            '--drain-timeout', type=float, default=60,
+            help='Segundos máximos para esperar que se vacíe la cola al terminar'
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', default='loadtest-results.json')
+        parser.add_argument('--compare', help='Reporte JSON anterior contra el cual comparar')
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options['mix'])
+        stand_ins = bench.use_stand_ins()
+
+        throttle = override_settings(THROTTLE_TIERS={}) if options['no_throttle'] else override_settings()
+        with bench.isolated_database(), throttle:
+            started = time.perf_counter()
+            product_ids = bench.seed(options['products'], options['admins'])
+            tokens = [
+                str(ClaimsTokenObtainPairSerializer.get_token(admin).access_token)
+                for admin in User.objects.filter(role=User.ADMIN)
+            ]
+            if not tokens and 'update' in mix:
+                raise CommandError('La operación update necesita --admins mayor que 0')
+            self.stdout.write(
+                f"Datos cargados: {len(product_ids)} productos, {options['admins']} admins "
+                f"en {time.perf_counter() - started:.1f}s"
+            )
+            mail.outbox = []
+
+            if stand_ins:
+                queue = bench.InProcessQueue(options['celery_concurrency'])
+                with queue.patch(send_product_update_notification):
+                    results = self._run(mix, product_ids, tokens, options, lambda: queue.depth)
+                    results['queue'].update(self._drain_in_process(queue))
+            else:
+                with celery_app.connection_for_read() as broker:
+                    channel = broker.default_channel
+                    name = celery_app.conf.task_default_queue
+                    # La consulta pasiva falla si la cola todavía no existe
+                    channel.queue_declare(queue=name, durable=True, auto_delete=False)
+
+                    def depth():
+                        return channel.queue_declare(queue=name, passive=True).message_count
+
+                    results = self._run(mix, product_ids, tokens, options, depth)
+                    results['queue'].update(self._drain_broker(depth, options))
+
+        for name, summary in results.items():
+            self.stdout.write(f'{name}: {summary}')
+
+        bench.write_results(options['output'], {
+            'mix': mix,
+            'products': options['products'],
+            'admins': options['admins'],
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'celery_concurrency': options['celery_concurrency'] if stand_ins else None,
+            'clients': options['clients'],
+            'throttle': not options['no_throttle'],
+            'stand_ins': stand_ins,
+        }, results)
+        self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['output']}"))
+
+        if options['compare']:
+            for name, delta in bench.compare(options['compare'], results).items():
+                if delta:
+                    self.stdout.write(f'{name}: variación % {delta}')
+
+    def _run(self, mix, product_ids, tokens, options, queue_depth):
+        names, weights = list(mix), list(mix.values())
+        concurrency = options['concurrency']
+        clients = [Client(raise_request_exception=False) for _ in range(concurrency)]
+        rngs = [random.Random(options['seed'] + index) for index in range(concurrency)]
+
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        throttled = defaultdict(int)
+
+        def call(index, iteration):
+            rng = rngs[index]
+            name = rng.choices(names, weights)[0]
+            method, url, data = OPERATIONS[name](product_ids, rng)
+            if name in ADMIN_OPERATIONS:
+                headers = {'HTTP_AUTHORIZATION': f'Bearer {rng.choice(tokens)}'}
+            else:
+                client = rng.randrange(options['clients'])
+                headers = {'HTTP_X_REAL_IP': f'10.0.{client // 256}.{client % 256}'}
+
+            started = time.perf_counter()
+            if method == 'patch':
+                response = clients[index].patch(url, data, content_type='application/json', **headers)
+            else:
+                response = clients[index].get(url, **headers)
+            latencies[name].append(time.perf_counter() - started)
+
+            if response.status_code == 429:
+                throttled[name] += 1
+            elif response.status_code >= 400:
+                errors[name] += 1
+            return response.status_code < 400
+
+        # SQLite no expone esperas por locks: se cuentan las peticiones que fallan por el lock
+        lock_errors = []
+
+        def record_exception(sender, **kwargs):
+            error = sys.exc_info()[1]
+            if isinstance(error, OperationalError) and 'locked' in str(error):
+                lock_errors.append(error)
+
+        probes = {'queue_depth': queue_depth}
+        lock_probe = lock_waits_probe()
+        if lock_probe:
+            probes['lock_waits'] = lock_probe
+        sampler = bench.Sampler(probes, options['sample_interval'])
+
+        got_request_exception.connect(record_exception)
+        sampler.start()
+        try:
+            overall = bench.run_concurrent(call, options['requests'], concurrency)
+        finally:
+            sampler.stop()
+            got_request_exception.disconnect(record_exception)
+
+        results = {'overall': overall}
+        for name in names:
+            results[name] = bench.summarize(latencies[name], overall['elapsed_s'], errors[name])
+            results[name]['throttled'] = throttled[name]
+        samples = sampler.summary()
+        results['queue'] = {'depth': samples['queue_depth']}
+        results['locks'] = {
+            'waiting_sessions': samples.get('lock_waits'),
+            'lock_errors': len(lock_errors),
+        }
+        return results
+
+    def _drain_in_process(self, queue):
+        started = time.perf_counter()
+        queue.drain()
+        elapsed = time.perf_counter() - started
+        summary = bench.summarize(queue.latencies, elapsed, queue.failed)
+        return {
+            'drain_s': round(elapsed, 3),
+            'completed': queue.completed,
+            'failed': queue.failed,
+            'task_p50_ms': summary['p50_ms'],
+            'task_p95_ms': summary['p95_ms'],
+            'task_p99_ms': summary['p99_ms'],
+            'emails_sent': len(mail.outbox),
+        }
+
+    def _drain_broker(self, depth, options):
+        """Espera a que el worker externo vacíe la cola del broker"""
+        started = time.perf_counter()
+        remaining = depth()
+        while remaining and time.perf_counter() - started < options['drain_timeout']:
+            time.sleep(options['sample_interval'])
+            remaining = depth()
+        return {
+            'drain_s': round(time.perf_counter() - started, 3),
+            'remaining': remaining,
+        }
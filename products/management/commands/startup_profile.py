@@ -0,0 +1,116 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from products import bench
+
+# Código que ejecuta cada tipo de proceso antes de poder atender trabajo
+TARGETS = {
+    # Worker de gunicorn listo para su primera petición (URLconf cargada)
+    'web': 'import core.wsgi; from django.urls import get_resolver; get_resolver().url_patterns',
+    'asgi': 'import core.asgi; from django.urls import get_resolver; get_resolver().url_patterns',
+    # Worker de Celery: setup de Django más el autodiscover de tareas
+    'celery': 'from core.celery import app; app.loader.import_default_modules()',
+}
+# Variables que docker-compose define para cada servicio
+TARGET_ENV = {
+    'celery': {'CELERY_SKIP_CHECKS': '1'},
+}
+
+
+def parse_importtime(output):
+    """Líneas de -X importtime -> [(módulo, self_us, cumulative_us, nivel)]"""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), level))
+    return rows
+
+
+class Command(BaseCommand):
+    help = 'Perfil de arranque (-X importtime) de los procesos web, ASGI y Celery'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--targets', default=','.join(TARGETS))
+        parser.add_argument('--runs', type=int, default=3, help='Ejecuciones por proceso (se toma la mediana)')
+        parser.add_argument('--top', type=int, default=10, help='Módulos más costosos a reportar')
+        parser.add_argument('--output', default='startup-profile.json')
+        parser.add_argument('--compare', help='Perfil JSON anterior contra el cual comparar')
+
+    def handle(self, *args, **options):
+        results = {}
+        for name in options['targets'].split(','):
+            if name not in TARGETS:
+                self.stderr.write(f'Proceso desconocido: {name}')
+                continue
+            results[name] = self._profile(name, options)
+            self.stdout.write(
+                f"{name}: {results[name]['wall_ms']} ms, imports {results[name]['import_ms']} ms, "
+                f"{results[name]['modules']} módulos"
+            )
+            for module, cumulative in results[name]['top'][:5]:
+                self.stdout.write(f'    {module}: {cumulative} ms')
+
+        report = {
+            'meta': {
+                'revision': bench.git_revision(),
+                'timestamp': timezone.now().isoformat(),
+                'python': sys.version.split()[0],
+                'runs': options['runs'],
+            },
+            'results': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Perfil guardado en {options['output']}"))
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                previous = json.load(f)['results']
+            for name, current in results.items():
+                before = previous.get(name)
+                if not before:
+                    continue
+                delta = {
+                    metric: round((current[metric] - before[metric]) / before[metric] * 100, 1)
+                    for metric in ('wall_ms', 'import_ms', 'modules')
+                    if before.get(metric)
+                }
+                self.stdout.write(f'{name}: variación % {delta}')
+
+    def _profile(self, name, options):
+        env = {**os.environ, **TARGET_ENV.get(name, {})}
+
+        runs = []
+        for _ in range(options['runs']):
+            started = time.perf_counter()
+            completed = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', TARGETS[name]],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True
+            )
+            wall = time.perf_counter() - started
+            if completed.returncode != 0:
+                raise RuntimeError(f'{name} falló al arrancar:\n{completed.stderr[-2000:]}')
+            rows = parse_importtime(completed.stderr)
+            runs.append((wall, rows))
+
+        # La ejecución mediana por tiempo total
+        runs.sort(key=lambda run: run[0])
+        wall, rows = runs[len(runs) // 2]
+        top_level = sorted((row for row in rows if row[3] == 0), key=lambda row: row[2], reverse=True)
+        return {
+            'wall_ms': round(wall * 1000, 1),
+            'wall_ms_all': [round(run[0] * 1000, 1) for run in runs],
+            'import_ms': round(sum(row[2] for row in top_level) / 1000, 1),
+            'modules': len(rows),
+            'top': [(module, round(cumulative / 1000, 1)) for module, _, cumulative, _ in top_level[:options['top']]],
+        }
@@ -0,0 +1,53 @@
+# Generated by Django 4.2 on 2026-10-19 12:37
+
+from django.conf import settings
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def create_brin_index(apps, schema_editor):
+    # BRIN: índice diminuto para tablas append-only ordenadas por tiempo (solo PostgreSQL)
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX producthistory_changed_brin ON products_producthistory '
+            'USING brin (changed_at)'
+        )
+
+
+def drop_brin_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS producthistory_changed_brin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_changes_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.BigIntegerField()),
+                ('brand', models.CharField(max_length=255)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('old_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('new_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('changes', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('changed_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='producthistory',
+            index=models.Index(fields=['product_id', 'changed_at'], name='producthistory_product_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producthistory',
+            index=models.Index(fields=['brand', 'changed_at'], name='producthistory_brand_idx'),
+        ),
+        migrations.RunPython(create_brin_index, drop_brin_index),
+    ]
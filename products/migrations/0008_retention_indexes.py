@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-19 12:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_history'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('read', True)), fields=['created_at'], name='notification_read_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productchange',
+            index=models.Index(fields=['product_id', 'id'], name='productchange_product_idx'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.2 on 2026-10-19 12:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Max, Min, OuterRef, Subquery, Sum
+
+
+def populate_brands(apps, schema_editor):
+    """Crea una marca por cada valor distinto de Product.brand y calcula sus agregados"""
+    Brand = apps.get_model('products', 'Brand')
+    Product = apps.get_model('products', 'Product')
+
+    names = Product.objects.values_list('brand', flat=True).distinct()
+    Brand.objects.bulk_create([Brand(name=name) for name in names], batch_size=1000)
+    Product.objects.update(
+        brand_ref=Subquery(Brand.objects.filter(name=OuterRef('brand')).values('pk')[:1])
+    )
+
+    brands = Brand.objects.in_bulk()
+    for row in Product.objects.values('brand_ref').annotate(
+        count=Count('id'), total=Sum('price'), low=Min('price'), high=Max('price'), views=Sum('view_count')
+    ):
+        brand = brands[row['brand_ref']]
+        brand.product_count = row['count']
+        brand.price_sum = row['total']
+        brand.min_price = row['low']
+        brand.max_price = row['high']
+        brand.total_views = row['views']
+    Brand.objects.bulk_update(
+        brands.values(),
+        ['product_count', 'price_sum', 'min_price', 'max_price', 'total_views'],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_retention_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Brand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('price_sum', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('total_views', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='brand_ref',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='products', to='products.brand'),
+        ),
+        migrations.RunPython(populate_brands, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['brand_ref', 'price'], name='product_brand_price_idx'),
+        ),
+    ]
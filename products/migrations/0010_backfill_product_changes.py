@@ -0,0 +1,41 @@
+from django.db import migrations
+from django.db.models import Exists, OuterRef
+
+BATCH_SIZE = 1000
+
+
+def backfill_changes(apps, schema_editor):
+    """
+    Un upsert por cada producto que no tiene entradas en el feed (los creados
+    antes de 0006 o con bulk_create), en orden de id, para que un consumidor
+    que empieza en since=0 reciba el catálogo completo.
+    """
+    Product = apps.get_model('products', 'Product')
+    ProductChange = apps.get_model('products', 'ProductChange')
+    missing = (
+        Product.objects.filter(~Exists(ProductChange.objects.filter(product_id=OuterRef('pk'))))
+        .order_by('id')
+        .values_list('id', 'sku')
+    )
+
+    last_id = 0
+    while True:
+        rows = list(missing.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not rows:
+            break
+        ProductChange.objects.bulk_create([
+            ProductChange(product_id=product_id, sku=sku, action='upsert')
+            for product_id, sku in rows
+        ])
+        last_id = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_brands'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_changes, migrations.RunPython.noop),
+    ]
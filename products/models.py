@@ -1,5 +1,9 @@
+from decimal import Decimal
+
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 
 class User(AbstractUser):
     ADMIN = 'admin'
@@ -40,26 +44,132 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
 
+class Brand(models.Model):
+    """
+    Marca normalizada con los agregados de sus productos, mantenidos de forma
+    incremental por products.brands (no se recalculan al leer).
+    """
+    name = models.CharField(max_length=255, unique=True)
+    product_count = models.PositiveIntegerField(default=0)
+    price_sum = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    total_views = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def avg_price(self):
+        if not self.product_count:
+            return None
+        return (self.price_sum / self.product_count).quantize(Decimal('0.01'))
+
+    def __str__(self):
+        return self.name
+
+
 class Product(models.Model):
+    # Valores leídos de la base; products.brands calcula con ellos los deltas de Brand
+    TRACKED_FIELDS = ('brand', 'brand_ref_id', 'price', 'view_count')
+
     sku = models.CharField(max_length=50, unique=True)
     name = models.CharField(max_length=255)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     brand = models.CharField(max_length=255)
+    # Se asigna a partir de brand en products.signals; el índice compuesto con
+    # price cubre las búsquedas por marca y el mínimo/máximo de precio
+    brand_ref = models.ForeignKey(
+        Brand, related_name='products', null=True, blank=True,
+        on_delete=models.SET_NULL, db_index=False
+    )
     view_count = models.PositiveIntegerField(default=0)
     created_by = models.ForeignKey(User, related_name='products_created', on_delete=models.CASCADE, blank=True, null=True)
     last_updated_by = models.ForeignKey(User, null=True, on_delete=models.SET_NULL)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     list_view_count = models.PositiveIntegerField(default=0)
     last_viewed = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['brand_ref', 'price'], name='product_brand_price_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.snapshot_loaded()
+        return instance
+
+    def snapshot_loaded(self):
+        """Guarda los valores actuales como los persistidos (se omiten los diferidos)"""
+        self._loaded = {field: self.__dict__[field] for field in self.TRACKED_FIELDS if field in self.__dict__}
+
     def __str__(self):
         return f"{self.sku} - {self.name}"
+
+
+class ProductChange(models.Model):
+    """
+    Registro append-only de cambios de productos para sincronización incremental.
+    El id autoincremental funciona como cursor monótono del feed.
+    """
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+
+    ACTION_CHOICES = [
+        (UPSERT, 'Upsert'),
+        (DELETE, 'Delete'),
+    ]
+
+    # Sin FK para que los tombstones sobrevivan al borrado del producto
+    product_id = models.BigIntegerField()
+    sku = models.CharField(max_length=50)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Compactación: buscar entradas posteriores del mismo producto
+            models.Index(fields=['product_id', 'id'], name='productchange_product_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.id} {self.action} {self.sku}"
     
+class ProductHistory(models.Model):
+    """
+    Historial append-only de cambios en price, name, brand y sku.
+    El índice BRIN sobre changed_at se crea en la migración (solo PostgreSQL).
+    """
+    product_id = models.BigIntegerField()
+    brand = models.CharField(max_length=255)
+    changed_by = models.ForeignKey(User, null=True, on_delete=models.SET_NULL, related_name='+')
+    changed_at = models.DateTimeField(default=timezone.now)
+    # Columnas dedicadas para que las gráficas de precio no lean el JSON
+    old_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    new_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    changes = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product_id', 'changed_at'], name='producthistory_product_idx'),
+            models.Index(fields=['brand', 'changed_at'], name='producthistory_brand_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.changed_at}"
+
+
 class Notification(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     title = models.CharField(max_length=200)
     message = models.TextField()
     metadata = models.JSONField(default=dict)
     created_at = models.DateTimeField(auto_now_add=True)
-    read = models.BooleanField(default=False)
\ No newline at end of file
+    read = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # Limpieza periódica de notificaciones leídas antiguas
+            models.Index(fields=['created_at'], condition=models.Q(read=True), name='notification_read_idx'),
+        ]
\ No newline at end of file
@@ -1,19 +1,15 @@
 from rest_framework import serializers
-from products.models import Product, User
+from products.models import Brand, Product, ProductHistory, User
 from django.contrib.auth.hashers import make_password
-from pathlib import Path
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from products.admin_users import hash_passwords
 import os
-from dotenv import load_dotenv
-from os.path import join
-
-BASE_DIR = Path(__file__).resolve().parent.parent
-dotenv_path = join(BASE_DIR, '.env')
-load_dotenv(dotenv_path)
 
 class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
-        fields = '__all__'
+        # brand_ref se mantiene a partir de brand (products.signals)
+        exclude = ['brand_ref']
         read_only_fields = ('created_by', 'created_at', 'updated_at')
         extra_kwargs = {
             'sku': {'required': False},
@@ -34,6 +30,20 @@ class ProductSerializer(serializers.ModelSerializer):
         return instance
     
 
+class ProductHistorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProductHistory
+        fields = ['id', 'product_id', 'brand', 'changed_by', 'changed_at', 'old_price', 'new_price', 'changes']
+
+
+class BrandSerializer(serializers.ModelSerializer):
+    avg_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = Brand
+        fields = ['id', 'name', 'product_count', 'min_price', 'avg_price', 'max_price', 'total_views', 'updated_at']
+
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -89,4 +99,45 @@ class AdminRegistrationSerializer(serializers.ModelSerializer):
         validated_data['role'] = User.ADMIN
         validated_data['is_staff'] = True
         
-        return User.objects.create(**validated_data)
\ No newline at end of file
+        return User.objects.create(**validated_data)
+
+class AdminBulkListSerializer(serializers.ListSerializer):
+    def validate(self, attrs):
+        usernames = [item['username'] for item in attrs]
+        repeated = sorted({username for username in usernames if usernames.count(username) > 1})
+        if repeated:
+            raise serializers.ValidationError(f"Usernames repetidos en el lote: {', '.join(repeated)}")
+        # Una sola consulta para todo el lote en lugar de un UniqueValidator por usuario
+        existing = sorted(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        if existing:
+            raise serializers.ValidationError(f"Usernames ya registrados: {', '.join(existing)}")
+        return attrs
+
+    def create(self, validated_data):
+        passwords = hash_passwords([item['password'] for item in validated_data])
+        return User.objects.bulk_create([
+            User(
+                username=item['username'],
+                email=item['email'],
+                password=password,
+                role=User.ADMIN,
+                is_staff=True
+            )
+            for item, password in zip(validated_data, passwords)
+        ])
+
+
+class AdminBulkUserSerializer(serializers.ModelSerializer):
+    """Un administrador dentro de un alta masiva (usar con many=True)"""
+    password = serializers.CharField(write_only=True, min_length=8)
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'email', 'password', 'role']
+        list_serializer_class = AdminBulkListSerializer
+        extra_kwargs = {
+            'email': {'required': True},
+            'role': {'read_only': True},
+            # La unicidad se valida por lote en AdminBulkListSerializer
+            'username': {'validators': [UnicodeUsernameValidator()]}
+        }
@@ -0,0 +1,53 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from . import brands
+from .admin_users import bump_list_version
+from .models import Product, ProductChange, User
+
+
+@receiver(pre_save, sender=Product)
+def assign_brand(sender, instance, **kwargs):
+    """Resuelve brand_ref a partir del texto de brand cuando es nuevo o cambió"""
+    if instance.brand_ref_id is None or instance.brand != getattr(instance, '_loaded', {}).get('brand'):
+        instance.brand_ref = brands.get_brand(instance.brand)
+
+
+@receiver(post_save, sender=Product)
+def update_brand_aggregates(sender, instance, created, **kwargs):
+    brands.product_saved(instance, created)
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_brand(sender, instance, **kwargs):
+    brands.product_deleted(instance)
+
+
+@receiver(post_save, sender=Product)
+def record_product_upsert(sender, instance, **kwargs):
+    """Registra la creación/actualización en el feed de cambios"""
+    ProductChange.objects.create(
+        product_id=instance.pk,
+        sku=instance.sku,
+        action=ProductChange.UPSERT
+    )
+
+
+@receiver(post_delete, sender=Product)
+def record_product_delete(sender, instance, **kwargs):
+    """Deja un tombstone en el feed de cambios al borrar un producto"""
+    ProductChange.objects.create(
+        product_id=instance.pk,
+        sku=instance.sku,
+        action=ProductChange.DELETE
+    )
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_admin_list(sender, **kwargs):
+    """
+    Descarta las páginas cacheadas del listado de admins cuando se confirma la
+    transacción: antes, otra petición podría volver a cachear la página vieja.
+    """
+    transaction.on_commit(bump_list_version)
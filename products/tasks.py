@@ -2,10 +2,14 @@ from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
 from celery import shared_task
 import logging
-from .models import User
-from datetime import datetime
+import time
+from .models import Notification, ProductChange, User
+from . import brands, unique_views
+from datetime import datetime, timedelta
 logger = logging.getLogger(__name__)
 
 @shared_task(bind=True, max_retries=3, default_retry_delay=60)
@@ -111,4 +115,84 @@ def send_product_deletion_notification(self, product_data, deleted_by_id):
 
     except Exception as e:
         logger.error(f"Error notificando eliminación: {str(e)}")
-        raise self.retry(exc=e)
\ No newline at end of file
+        raise self.retry(exc=e)
+
+
+def _delete_in_batches(queryset):
+    """
+    Borra las filas del queryset en lotes de MAINTENANCE_BATCH_SIZE por clave
+    primaria, con MAINTENANCE_BATCH_PAUSE segundos entre lotes, para que cada
+    DELETE sea una transacción corta. Cada lote continúa desde la última clave
+    borrada: las filas que no cumplen el filtro se recorren una sola vez.
+    Devuelve el total de filas borradas.
+    """
+    batch_size = settings.MAINTENANCE_BATCH_SIZE
+    model = queryset.model
+    queryset = queryset.order_by('pk')
+    total = 0
+    last_pk = None
+    while True:
+        batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        ids = list(batch.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        model.objects.filter(pk__in=ids).delete()
+        total += len(ids)
+        if len(ids) < batch_size:
+            break
+        last_pk = ids[-1]
+        time.sleep(settings.MAINTENANCE_BATCH_PAUSE)
+    return total
+
+
+@shared_task
+def purge_read_notifications():
+    """Borra las notificaciones leídas con más de NOTIFICATION_RETENTION_DAYS días"""
+    cutoff = timezone.now() - timedelta(days=settings.NOTIFICATION_RETENTION_DAYS)
+    deleted = _delete_in_batches(Notification.objects.filter(read=True, created_at__lt=cutoff))
+    logger.info(f"Notificaciones leídas eliminadas: {deleted}")
+    return {'processed': deleted}
+
+
+@shared_task
+def compact_product_changes():
+    """
+    Compacta el feed de cambios: borra las entradas con más de
+    PRODUCT_CHANGES_RETENTION_DAYS días que ya tienen una entrada posterior del
+    mismo producto. Un cliente con un cursor antiguo sigue recibiendo la última
+    entrada de cada producto, así que la sincronización no cambia.
+    """
+    cutoff = timezone.now() - timedelta(days=settings.PRODUCT_CHANGES_RETENTION_DAYS)
+    superseded = ProductChange.objects.filter(created_at__lt=cutoff).filter(
+        Exists(ProductChange.objects.filter(product_id=OuterRef('product_id'), id__gt=OuterRef('id')))
+    )
+    deleted = _delete_in_batches(superseded)
+    logger.info(f"Entradas del feed de cambios compactadas: {deleted}")
+    return {'processed': deleted}
+
+
+@shared_task
+def rollup_unique_views():
+    """Compacta los buckets horarios de visitantes únicos en buckets diarios"""
+    older_than = timezone.now() - timedelta(hours=settings.UNIQUE_VIEWS_HOURLY_HOURS)
+    processed = unique_views.rollup(
+        older_than, settings.MAINTENANCE_BATCH_SIZE, settings.MAINTENANCE_BATCH_PAUSE
+    )
+    logger.info(f"Buckets horarios de visitantes únicos compactados: {processed}")
+    return {'processed': processed}
+
+
+@shared_task
+def flush_brand_views():
+    """Aplica a Brand.total_views las vistas acumuladas en Redis"""
+    processed = brands.flush_views()
+    logger.info(f"Vistas aplicadas a los agregados por marca: {processed}")
+    return {'processed': processed}
+
+
+@shared_task
+def rebuild_brand_aggregates():
+    """Recalcula los agregados por marca para corregir la deriva de los deltas"""
+    processed = brands.rebuild()
+    logger.info(f"Marcas recalculadas: {processed}")
+    return {'processed': processed}
@@ -1,3 +1,395 @@
-from django.test import TestCase
+import re
+from datetime import datetime, timedelta
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+import redis
+from asgiref.sync import async_to_sync
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core import metrics, redis_client
+from core.authentication import ClaimsTokenObtainPairSerializer
+from core.redis_client import get_redis
+from core.testing import RedisTestCase, RedisTransactionTestCase
+
+from . import admin_users, async_views, brands, tasks, unique_views
+from .history import build_entry, record_changes
+from .models import Brand, Notification, Product, ProductChange, ProductHistory, User
+from .serializers import AdminBulkListSerializer
+
+backfill_changes = import_module('products.migrations.0010_backfill_product_changes').backfill_changes
+
+
+@override_settings(PRODUCT_CHANGES_SETTLE_SECONDS=0)
+class ProductChangesFeedTests(RedisTestCase):
+    def test_since_zero_returns_catalog_created_without_signals(self):
+        products = Product.objects.bulk_create([
+            Product(sku=f'SKU-{i}', name=f'Producto {i}', price=10 + i, brand='Acme')
+            for i in range(5)
+        ])
+        # Uno ya tiene entrada en el feed: el backfill no lo duplica
+        ProductChange.objects.create(product_id=products[2].pk, sku='SKU-2', action=ProductChange.UPSERT)
+
+        backfill_changes(apps, None)
+
+        response = self.client.get('/api/products/changes/?since=0')
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertCountEqual([entry['product_id'] for entry in results], [product.pk for product in products])
+        self.assertTrue(all(entry['action'] == ProductChange.UPSERT and entry['product'] for entry in results))
+        self.assertFalse(response.json()['has_more'])
+
+    def test_backfill_follows_product_id_order(self):
+        products = Product.objects.bulk_create([
+            Product(sku=f'SKU-{i}', name=f'Producto {i}', price=10, brand='Acme') for i in range(3)
+        ])
+        backfill_changes(apps, None)
+        self.assertEqual(
+            list(ProductChange.objects.order_by('id').values_list('product_id', flat=True)),
+            [product.pk for product in products]
+        )
+
+
+class ProductHistoryTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user('admin', 'admin@example.com', 'clave', role=User.ADMIN)
+        token = ClaimsTokenObtainPairSerializer.get_token(self.admin).access_token
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+        self.product = Product.objects.create(sku='SKU-1', name='Producto', price=10, brand='Acme')
+        other = Product.objects.create(sku='SKU-2', name='Otro', price=10, brand='Otra')
+        entries = record_changes([
+            build_entry(self.product, {'price': {'old': 10, 'new': 12}}, self.admin),
+            build_entry(self.product, {'name': {'old': 'Producto', 'new': 'Nuevo'}}, self.admin),
+            build_entry(self.product, {'price': {'old': 12, 'new': 15}}, self.admin),
+            build_entry(other, {'price': {'old': 10, 'new': 11}}, self.admin),
+        ])
+        for entry, day in zip(entries, (1, 10, 20, 10)):
+            ProductHistory.objects.filter(pk=entry.pk).update(
+                changed_at=timezone.make_aware(datetime(2024, 1, day, 12))
+            )
+
+    def _get(self, url):
+        response = self.client.get(url, **self.auth)
+        self.assertEqual(response.status_code, 200, response.content[:200])
+        return response.json()
+
+    def test_product_history_filters_by_range_and_field(self):
+        url = f'/api/products/{self.product.pk}/history/'
+        self.assertEqual([row['new_price'] for row in self._get(url)], ['12.00', None, '15.00'])
+        self.assertEqual([row['new_price'] for row in self._get(url + '?field=price')], ['12.00', '15.00'])
+        # Las fechas sin hora abarcan el día completo
+        self.assertEqual(len(self._get(url + '?start=2024-01-10&end=2024-01-20')), 2)
+        self.assertEqual(len(self._get(url + '?start=2024-01-10T13:00:00')), 1)
+        self.assertEqual(len(self._get(url + '?end=2024-01-09')), 1)
+
+    def test_brand_history(self):
+        rows = self._get('/api/products/history/?brand=Acme&start=2024-01-05')
+        self.assertEqual([row['changes'] for row in rows], [
+            {'name': {'old': 'Producto', 'new': 'Nuevo'}}, {'price': {'old': 12, 'new': 15}}
+        ])
+        response = self.client.get('/api/products/history/', **self.auth)
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_dates_are_rejected(self):
+        url = f'/api/products/{self.product.pk}/history/'
+        for value in ('garbage', '2024-02-30', '2024-01-01T25:00:00'):
+            with self.subTest(value=value):
+                response = self.client.get(url, {'start': value}, **self.auth)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('start', response.json())
+
+    def test_compact_mode_stores_only_changed_fields(self):
+        changes = {'price': {'old': 10, 'new': 12}}
+        with self.settings(PRODUCT_HISTORY_COMPACT=True):
+            self.assertEqual(build_entry(self.product, changes).changes, changes)
+        with self.settings(PRODUCT_HISTORY_COMPACT=False):
+            snapshot = build_entry(self.product, changes).changes['snapshot']
+        self.assertEqual(snapshot, {'price': 10, 'name': 'Producto', 'brand': 'Acme', 'sku': 'SKU-1'})
+
+# Petición representativa de cada entrada de QUERY_BUDGETS: (url, datos del POST, requiere admin)
+BUDGET_REQUESTS = {
+    'GET product-list': ('/api/products/', None, False),
+    'GET product-detail': ('/api/products/{product}/', None, False),
+    'GET product-stats': ('/api/products/stats/', None, False),
+    'GET product-view-analytics': ('/api/products/view_analytics/?range=30d', None, False),
+    'GET product-changes': ('/api/products/changes/?since=0', None, False),
+    'GET product-history': ('/api/products/{product}/history/', None, True),
+    'GET product-brand-history': ('/api/products/history/?brand=Acme', None, True),
+    'GET product-brands': ('/api/products/brands/', None, False),
+    'GET adminuser-list': ('/api/admin-users/', None, True),
+    'POST adminuser-bulk': (
+        '/api/admin-users/bulk/',
+        [{'username': 'nuevo-admin', 'email': 'nuevo@example.com', 'password': 'clave-segura-123'}],
+        True
+    ),
+    'GET async-product-list': ('/api/async/products/', None, False),
+    'GET async-product-detail': ('/api/async/products/{product}/', None, False),
+    'GET async-product-stats': ('/api/async/products/stats/', None, False),
+    'GET async-product-view-analytics': ('/api/async/products/view_analytics/?range=30d', None, False),
+}
+
+
+@override_settings(PRODUCT_CHANGES_SETTLE_SECONDS=0)
+class QueryBudgetTests(RedisTransactionTestCase):
+    """
+    Con QUERY_BUDGET_STRICT (activo en los tests) QueryMetricsMiddleware lanza
+    QueryBudgetExceeded si un endpoint supera su presupuesto.
+    """
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user('admin', 'admin@example.com', 'clave', role=User.ADMIN)
+        for i in range(3):
+            product = Product.objects.create(sku=f'SKU-{i}', name=f'Producto {i}', price=10 + i, brand='Acme')
+            old_price = product.price
+            product.price = 20 + i
+            product.save()
+            record_changes([build_entry(product, {'price': {'old': old_price, 'new': product.price}}, self.admin)])
+        self.product = product
+        token = ClaimsTokenObtainPairSerializer.get_token(self.admin).access_token
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+    def test_every_budget_has_a_request(self):
+        self.assertCountEqual(BUDGET_REQUESTS, settings.QUERY_BUDGETS)
+
+    def _check(self, headers, include_admin):
+        for key, (_, _, admin_only) in BUDGET_REQUESTS.items():
+            if admin_only and not include_admin:
+                continue
+            with self.subTest(key=key):
+                method, _ = key.split(' ')
+                url, data, _ = BUDGET_REQUESTS[key]
+                url = url.format(product=self.product.pk)
+                if key.startswith('GET async-'):
+                    response = async_to_sync(self._async_get)(url, headers)
+                elif method == 'POST':
+                    response = self.client.post(url, data, content_type='application/json', **headers)
+                else:
+                    response = self.client.get(url, **headers)
+                self.assertLess(response.status_code, 400, response.content[:200])
+
+    async def _async_get(self, url, headers):
+        response = await self.async_client.get(url, **headers)
+        await async_views.wait_for_background_tasks()
+        return response
+
+    def test_anonymous_requests_stay_within_budget(self):
+        self._check({}, include_admin=False)
+
+    @override_settings(JWT_STATELESS_AUTH=True)
+    def test_stateless_jwt_requests_stay_within_budget(self):
+        self._check(self.auth, include_admin=True)
+
+    @override_settings(JWT_STATELESS_AUTH=False)
+    def test_authentication_queries_do_not_count(self):
+        # La consulta del usuario por id no depende del endpoint
+        self._check(self.auth, include_admin=True)
+
+
+@override_settings(METRICS_ALLOWED_IPS=['127.0.0.1'])
+class MetricsAggregationTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        # El registro del proceso acumula lo que incrementaron los tests anteriores
+        self.enterContext(mock.patch.object(metrics, 'registry', metrics.MetricsRegistry()))
+
+    def test_scrape_sums_counters_from_every_process(self):
+        # Dos workers de gunicorn: cada uno con su registro en memoria
+        first, second = metrics.MetricsRegistry(), metrics.MetricsRegistry()
+        first.inc('http_requests_total', {'endpoint': 'product-list', 'method': 'GET', 'status': '200'}, 3)
+        second.inc('http_requests_total', {'endpoint': 'product-list', 'method': 'GET', 'status': '200'}, 4)
+        first.flush()
+        second.flush()
+
+        response = self.client.get('/internal/metrics/', REMOTE_ADDR='127.0.0.1')
+        self.assertIn(
+            'http_requests_total{endpoint="product-list",method="GET",status="200"} 7',
+            response.content.decode()
+        )
+
+    def test_flush_keeps_increments_when_redis_fails(self):
+        registry = metrics.MetricsRegistry()
+        registry.inc('cache_requests_total', {'tier': 'redis', 'result': 'hit'})
+        with mock.patch.object(metrics, 'get_redis', side_effect=ConnectionError):
+            registry.flush()
+        registry.flush()
+
+        response = self.client.get('/internal/metrics/', REMOTE_ADDR='127.0.0.1')
+        self.assertIn('cache_requests_total{result="hit",tier="redis"} 1', response.content.decode())
+
+
+@override_settings(MAINTENANCE_BATCH_SIZE=2, MAINTENANCE_BATCH_PAUSE=0)
+class MaintenanceTaskTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.old = timezone.now() - timedelta(days=365)
+
+    def test_purge_read_notifications_keeps_unread_and_recent(self):
+        user = User.objects.create_user('admin', 'admin@example.com', 'clave', role=User.ADMIN)
+        for read in (True, True, True, False):
+            Notification.objects.create(user=user, title='t', message='m', read=read)
+        recent = Notification.objects.create(user=user, title='t', message='m', read=True)
+        Notification.objects.exclude(pk=recent.pk).update(created_at=self.old)
+
+        self.assertEqual(tasks.purge_read_notifications(), {'processed': 3})
+        self.assertCountEqual(
+            Notification.objects.values_list('read', flat=True), [False, True]
+        )
+
+    def test_compact_product_changes_keeps_latest_entry_per_product(self):
+        # Entradas viejas sin reemplazo antes de las reemplazadas: el recorrido no vuelve sobre ellas
+        for product_id in range(1, 6):
+            ProductChange.objects.create(product_id=product_id, sku=f'SKU-{product_id}', action=ProductChange.UPSERT)
+        for _ in range(3):
+            ProductChange.objects.create(product_id=9, sku='SKU-9', action=ProductChange.UPSERT)
+        latest = ProductChange.objects.create(product_id=9, sku='SKU-9', action=ProductChange.DELETE)
+        ProductChange.objects.update(created_at=self.old)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(tasks.compact_product_changes(), {'processed': 3})
+        self.assertCountEqual(
+            ProductChange.objects.values_list('product_id', flat=True), [1, 2, 3, 4, 5, 9]
+        )
+        self.assertTrue(ProductChange.objects.filter(pk=latest.pk).exists())
+        selects = [query['sql'] for query in queries if query['sql'].startswith('SELECT')]
+        # Después del primer lote cada SELECT continúa desde la última clave borrada
+        self.assertTrue(all(re.search(r'"products_productchange"\."id" > \d+', sql) for sql in selects[1:]), selects)
+
+    def test_rollup_unique_views_merges_old_hours_into_days(self):
+        old_hour = timezone.now() - timedelta(days=5)
+        for hour in range(3):
+            unique_views.record_view(1, f'viewer-{hour}', now=old_hour + timedelta(hours=hour))
+        unique_views.record_view(1, 'viewer-recent')
+
+        # 3 horas viejas del producto y 3 del bucket global
+        self.assertEqual(tasks.rollup_unique_views(), {'processed': 6})
+        redis = get_redis()
+        self.assertEqual(redis.pfcount(unique_views.day_key(1, old_hour)), 3)
+        self.assertFalse(redis.exists(unique_views.hour_key(1, old_hour)))
+        self.assertTrue(redis.exists(unique_views.hour_key(1, timezone.now())))
+
+
+class AdminListInvalidationTests(RedisTestCase):
+    def test_version_changes_when_the_user_write_commits(self):
+        version = admin_users.list_version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            User.objects.create_user('admin', 'admin@example.com', 'clave', role=User.ADMIN)
+            self.assertEqual(admin_users.list_version(), version)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(admin_users.list_version(), version)
+
+    def test_list_is_served_uncached_when_the_version_cannot_be_read(self):
+        admin = User.objects.create_user('admin', 'admin@example.com', 'clave', role=User.ADMIN)
+        token = ClaimsTokenObtainPairSerializer.get_token(admin).access_token
+        with mock.patch.object(admin_users.cache, 'get_or_set', side_effect=ConnectionError), \
+                self.assertLogs('products.admin_users', 'WARNING'):
+            response = self.client.get('/api/admin-users/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([user['username'] for user in response.json()['results']], ['admin'])
+
+    def test_user_writes_succeed_with_cache_unreachable(self):
+        unreachable = redis.ConnectionPool(host='127.0.0.1', port=1, socket_connect_timeout=0.1)
+        with mock.patch.object(redis_client, '_pool', unreachable), \
+                self.assertLogs('core.cache', 'WARNING'), \
+                self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.create_user('admin', 'admin@example.com', 'clave', role=User.ADMIN)
+            user.delete()
+        self.assertFalse(User.objects.exists())
+
+
+class BrandViewTests(RedisTransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(sku='SKU-1', name='Producto', price=10, brand='Acme')
+        # Vistas de clientes distintos que quedan pendientes de flush_views
+        for i in range(3):
+            response = self.client.get(f'/api/products/{self.product.pk}/', REMOTE_ADDR=f'198.51.100.{i}')
+            self.assertEqual(response.status_code, 200)
+        self.product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual(self.product.view_count, 3)
+
+    def test_deleting_a_product_with_pending_views(self):
+        brand = self.product.brand_ref
+        self.product.delete()
+        brands.flush_views()
+        brand.refresh_from_db()
+        self.assertEqual((brand.product_count, brand.total_views), (0, 0))
+
+    def test_changing_brand_with_pending_views(self):
+        old_brand = self.product.brand_ref
+        self.product.brand = 'Otra'
+        self.product.save()
+        brands.flush_views()
+        old_brand.refresh_from_db()
+        self.assertEqual(old_brand.total_views, 0)
+        self.assertEqual(Brand.objects.get(name='Otra').total_views, 3)
+
+    def test_missing_products_are_not_counted(self):
+        brands.flush_views()
+        for pk in ('abc', '999999'):
+            response = self.client.get(f'/api/products/{pk}/', REMOTE_ADDR='198.51.100.20')
+            self.assertEqual(response.status_code, 404)
+        redis = get_redis()
+        self.assertFalse(redis.exists(brands.PENDING_VIEWS_KEY))
+        self.assertEqual(redis.keys('uniques:abc:*') + redis.keys('uniques:999999:*'), [])
+
+    def test_flush_drops_invalid_fields(self):
+        get_redis().hset(brands.PENDING_VIEWS_KEY, 'abc', 1)
+        with self.assertLogs('products.brands', 'WARNING'):
+            self.assertEqual(brands.flush_views(), 3)
+        self.assertFalse(get_redis().exists(brands.FLUSHING_VIEWS_KEY))
+        self.assertEqual(Brand.objects.get(name='Acme').total_views, 3)
+
+    def test_rebuild_does_not_count_views_recorded_meanwhile_twice(self):
+        in_bulk = Brand.objects.in_bulk
+
+        def view_during_rebuild(*args, **kwargs):
+            self.client.get(f'/api/products/{self.product.pk}/', REMOTE_ADDR='198.51.100.9')
+            return in_bulk(*args, **kwargs)
+
+        with mock.patch.object(Brand.objects, 'in_bulk', side_effect=view_during_rebuild):
+            brands.rebuild()
+        brands.flush_views()
+        self.assertEqual(Brand.objects.get(name='Acme').total_views, 4)
+
+
+class AdminBulkTests(RedisTransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        admin = User.objects.create_user('admin', 'admin@example.com', 'clave', role=User.ADMIN)
+        token = ClaimsTokenObtainPairSerializer.get_token(admin).access_token
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+    def _post(self, users):
+        return self.client.post('/api/admin-users/bulk/', users, content_type='application/json', **self.auth)
+
+    def _users(self, *usernames):
+        return [
+            {'username': username, 'email': f'{username}@example.com', 'password': f'clave-{username}-123'}
+            for username in usernames
+        ]
+
+    def test_passwords_are_hashed_in_the_process_pool(self):
+        response = self._post(self._users('uno', 'dos', 'tres'))
+        self.assertEqual(response.status_code, 201, response.content[:200])
+        for user in User.objects.filter(username__in=['uno', 'dos', 'tres']):
+            self.assertEqual(user.role, User.ADMIN)
+            self.assertTrue(user.check_password(f'clave-{user.username}-123'))
+
+    def test_duplicate_usernames_are_rejected(self):
+        for users in (self._users('uno', 'uno'), self._users('uno', 'admin')):
+            with self.subTest(users=[user['username'] for user in users]):
+                self.assertEqual(self._post(users).status_code, 400)
+        self.assertFalse(User.objects.filter(username='uno').exists())
+
+    def test_username_registered_after_validation_is_a_conflict(self):
+        with mock.patch.object(AdminBulkListSerializer, 'validate', lambda self, attrs: attrs):
+            response = self._post(self._users('uno', 'admin'))
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(User.objects.filter(username='uno').exists())
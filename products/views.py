@@ -1,43 +1,58 @@
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from .models import Product, User
-from .serializers import ProductSerializer, UserSerializer, AdminRegistrationSerializer
+from .models import Brand, Product, ProductChange, ProductHistory, User
+from .serializers import (
+    AdminBulkUserSerializer, AdminRegistrationSerializer, BrandSerializer, ProductHistorySerializer,
+    ProductSerializer, UserSerializer
+)
 from core.permissions import IsAdminUser
-from django.core.mail import send_mail
+from core.authentication import mark_user_changed
+from core.throttling import RedisRateThrottle
 from django.conf import settings
-from threading import Thread
+from django.core.cache import cache
 from rest_framework.permissions import AllowAny
 from rest_framework.views import APIView
-from django.db.models import F, Sum, Count
+from django.db.models import F, Sum
 from datetime import datetime, timedelta
 import logging
 from .tasks import send_product_update_notification
-from django.db import transaction
+from .history import SIGNIFICANT_FIELDS, build_entry, record_changes
+from .unique_views import ALL_PRODUCTS, fingerprint, record_view, unique_viewers
+from .admin_users import bump_list_version, list_version
+from . import brands
+from django.db import IntegrityError, transaction
 from django.db.models import Avg
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
 
 logger = logging.getLogger(__name__)
 
-# products/views.py
-from drf_yasg.utils import swagger_auto_schema
-from drf_yasg import openapi
-
 class ProductViewSet(viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    throttle_classes = [RedisRateThrottle]
     
     def get_permissions(self):
-        if self.action in ['list', 'retrieve', 'stats', 'view_analytics']:
+        if self.action in ['list', 'retrieve', 'stats', 'view_analytics', 'changes', 'brand_stats']:
             return []  # AllowAny
         return [IsAdminUser()]
 
     def retrieve(self, request, *args, **kwargs):
-        if not request.user.is_authenticated:
-            self._increment_view_count(kwargs['pk'])
-        return super().retrieve(request, *args, **kwargs)
+        # Se cuenta después de encontrar el producto: un pk inexistente o inválido
+        # no debe llegar a los contadores de Redis
+        instance = self.get_object()
+        # RedisRateThrottle marca las vistas repetidas del mismo cliente
+        if not request.user.is_authenticated and not getattr(request, 'is_repeat_view', False):
+            self._increment_view_count(instance.pk)
+            record_view(instance.pk, fingerprint(request))
+            brands.record_view(instance.pk)
+        return Response(self.get_serializer(instance).data)
 
     def list(self, request, *args, **kwargs):
-        if not request.user.is_authenticated:
+        if not request.user.is_authenticated and not getattr(request, 'is_repeat_view', False):
             self._increment_list_view_count()
         return super().list(request, *args, **kwargs)
 
@@ -69,21 +84,22 @@ class ProductViewSet(viewsets.ModelViewSet):
         serializer.save(created_by=self.request.user)
 
     def perform_update(self, serializer):
-        """Actualiza un producto y notifica cambios"""
+        """Actualiza un producto, registra el historial y notifica cambios"""
         old_instance = self.get_object()
         instance = serializer.save(last_updated_by=self.request.user)
+        changes = self._detect_changes(old_instance, instance)
+        if changes:
+            record_changes([build_entry(instance, changes, self.request.user)])
         
         if self.request.user.is_admin:
-            changes = self._detect_changes(old_instance, instance)
             if changes:
                 self._send_notifications(instance, changes)
 
     def _detect_changes(self, old_instance, new_instance):
         """Detecta cambios significativos en el producto"""
         changes = {}
-        significant_fields = ['price', 'name', 'brand', 'sku']
         
-        for field in significant_fields:
+        for field in SIGNIFICANT_FIELDS:
             old_value = getattr(old_instance, field)
             new_value = getattr(new_instance, field)
             if old_value != new_value:
@@ -109,20 +125,23 @@ class ProductViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['GET'])
     def stats(self, request):
-        """Estadísticas básicas de productos"""
-        stats = {
-            'total_products': Product.objects.count(),
-            'total_views': Product.objects.aggregate(total=Sum('view_count'))['total'] or 0,
-            'total_list_views': Product.objects.aggregate(total=Sum('list_view_count'))['total'] or 0,
-            'most_viewed': ProductSerializer(
-                Product.objects.order_by('-view_count')[:5],
-                many=True
-            ).data,
-            'recently_updated': ProductSerializer(
-                Product.objects.order_by('-updated_at')[:5],
-                many=True
-            ).data
-        }
+        """Estadísticas básicas de productos, cacheadas (compartidas con la API asíncrona)"""
+        stats = cache.get('products:stats')
+        if stats is None:
+            stats = {
+                'total_products': Product.objects.count(),
+                'total_views': Product.objects.aggregate(total=Sum('view_count'))['total'] or 0,
+                'total_list_views': Product.objects.aggregate(total=Sum('list_view_count'))['total'] or 0,
+                'most_viewed': ProductSerializer(
+                    Product.objects.order_by('-view_count')[:5],
+                    many=True
+                ).data,
+                'recently_updated': ProductSerializer(
+                    Product.objects.order_by('-updated_at')[:5],
+                    many=True
+                ).data
+            }
+            cache.set('products:stats', stats, settings.CACHE_TTLS['product_stats'])
         return Response(stats)
 
     @action(detail=False, methods=['GET'])
@@ -144,6 +163,17 @@ class ProductViewSet(viewsets.ModelViewSet):
             
         cutoff_date = datetime.now() - delta
 
+        # Dividir entre los días del periodo no altera el orden, y con '24h' era división por cero
+        trending_products = ProductSerializer(
+            Product.objects.filter(
+                last_viewed__gte=cutoff_date
+            ).order_by('-view_count')[:5],
+            many=True
+        ).data
+        uniques = unique_viewers([product['id'] for product in trending_products], delta)
+        for product in trending_products:
+            product['unique_viewers'] = uniques.get(product['id'], 0)
+
         analytics = {
             'period': str(delta),
             'start_date': cutoff_date,
@@ -157,7 +187,8 @@ class ProductViewSet(viewsets.ModelViewSet):
                 ).count(),
                 'views_per_product': Product.objects.filter(
                     last_viewed__gte=cutoff_date
-                ).aggregate(avg=Avg('view_count'))['avg'] or 0
+                ).aggregate(avg=Avg('view_count'))['avg'] or 0,
+                'unique_viewers': uniques.get(ALL_PRODUCTS, 0)
             },
             'product_views': Product.objects.filter(
                 last_viewed__gte=cutoff_date
@@ -165,20 +196,154 @@ class ProductViewSet(viewsets.ModelViewSet):
                 views=Sum('view_count'),
                 last_viewed=F('last_viewed')
             ).order_by('-views'),
-            'trending_products': Product.objects.filter(
-                last_viewed__gte=cutoff_date
-            ).annotate(
-                view_increase=Sum('view_count') / delta.days
-            ).order_by('-view_increase')[:5]
+            'trending_products': trending_products
         }
 
         return Response(analytics)
 
+    def _history_filters(self, request):
+        """Rango start/end (fecha o fecha-hora ISO) para las consultas de historial"""
+        filters = {}
+        for param, lookup, day_edge in (('start', 'changed_at__gte', datetime.min.time()),
+                                        ('end', 'changed_at__lte', datetime.max.time())):
+            value = request.query_params.get(param)
+            if not value:
+                continue
+            try:
+                # La fecha sola primero: parse_datetime la acepta como medianoche
+                # y el end excluiría el último día
+                day = parse_date(value)
+                moment = datetime.combine(day, day_edge) if day else parse_datetime(value)
+            except ValueError:
+                # Formato correcto con valores imposibles, como 2024-02-30
+                moment = None
+            if moment is None:
+                raise ValidationError({param: 'Fecha inválida, usa el formato ISO 8601'})
+            if timezone.is_naive(moment):
+                moment = timezone.make_aware(moment)
+            filters[lookup] = moment
+        return filters
+
+    def _history_response(self, queryset):
+        rows = queryset.order_by('changed_at')[:settings.PRODUCT_HISTORY_MAX_ROWS]
+        return Response(ProductHistorySerializer(rows, many=True).data)
+
+    @action(detail=True, methods=['GET'])
+    def history(self, request, pk=None):
+        """Historial de cambios de un producto; ?field=price para graficar precios"""
+        queryset = ProductHistory.objects.filter(product_id=pk, **self._history_filters(request))
+        if request.query_params.get('field') == 'price':
+            queryset = queryset.filter(new_price__isnull=False)
+        return self._history_response(queryset)
+
+    @action(detail=False, methods=['GET'], url_path='history', url_name='brand-history')
+    def brand_history(self, request):
+        """Historial de cambios de todos los productos de una marca (?brand=)"""
+        brand = request.query_params.get('brand')
+        if not brand:
+            raise ValidationError({'brand': 'Este parámetro es requerido'})
+        queryset = ProductHistory.objects.filter(brand=brand, **self._history_filters(request))
+        return self._history_response(queryset)
+
+    @action(detail=False, methods=['GET'], url_path='brands', url_name='brands')
+    def brand_stats(self, request):
+        """Agregados por marca, mantenidos incrementalmente (products.brands)"""
+        queryset = Brand.objects.filter(product_count__gt=0).order_by('name')
+        return Response(BrandSerializer(queryset, many=True).data)
+
+    @action(detail=False, methods=['GET'])
+    def changes(self, request):
+        """Feed incremental de cambios (altas, ediciones y borrados) desde un cursor"""
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = int(request.query_params.get('limit', settings.PRODUCT_CHANGES_PAGE_SIZE))
+        except ValueError:
+            return Response(
+                {'detail': 'Los parámetros since y limit deben ser enteros'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = max(1, min(limit, settings.PRODUCT_CHANGES_MAX_PAGE_SIZE))
+        settled = timezone.now() - timedelta(seconds=settings.PRODUCT_CHANGES_SETTLE_SECONDS)
+
+        # Recorre el índice de la PK: el costo depende de los cambios, no del catálogo
+        entries = list(
+            ProductChange.objects.filter(id__gt=since, created_at__lte=settled)
+            .order_by('id')[:limit + 1]
+        )
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+
+        products = Product.objects.in_bulk(
+            {entry.product_id for entry in entries if entry.action == ProductChange.UPSERT}
+        )
+        results = []
+        for entry in entries:
+            product = products.get(entry.product_id)
+            results.append({
+                'cursor': entry.id,
+                'action': entry.action,
+                'product_id': entry.product_id,
+                'sku': entry.sku,
+                'changed_at': entry.created_at,
+                # None si el producto fue borrado después; su tombstone llega más adelante
+                'product': ProductSerializer(product).data if product else None
+            })
+
+        return Response({
+            'results': results,
+            'next_cursor': entries[-1].id if entries else since,
+            'has_more': has_more
+        })
+
+
+class AdminUserPagination(PageNumberPagination):
+    page_size = settings.ADMIN_USERS_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
 
 class AdminUserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.filter(role=User.ADMIN)
+    queryset = User.objects.filter(role=User.ADMIN).order_by('id')
     serializer_class = UserSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = AdminUserPagination
+
+    def list(self, request, *args, **kwargs):
+        """Listado paginado; cada página se cachea hasta que cambia algún usuario"""
+        version = list_version()
+        if version is None:
+            return super().list(request, *args, **kwargs)
+        paginator = self.paginator
+        cache_key = 'admin-users:{}:{}:{}'.format(
+            version,
+            request.query_params.get(paginator.page_query_param, 1),
+            paginator.get_page_size(request)
+        )
+        data = cache.get(cache_key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            cache.set(cache_key, data, settings.CACHE_TTLS['admin_users'])
+        return Response(data)
+
+    @action(detail=False, methods=['POST'])
+    def bulk(self, request):
+        """Alta masiva: lista de {username, email, password} en una sola inserción"""
+        serializer = AdminBulkUserSerializer(
+            data=request.data, many=True, allow_empty=False, max_length=settings.ADMIN_BULK_MAX_USERS
+        )
+        serializer.is_valid(raise_exception=True)
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            # Otro proceso registró alguno de los usernames después de la validación
+            return Response(
+                {'detail': 'Alguno de los usernames ya está registrado'},
+                status=status.HTTP_409_CONFLICT
+            )
+        # bulk_create no envía post_save
+        bump_list_version()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def create(self, request, *args, **kwargs):
         required_fields = ['username', 'password', 'email']
@@ -214,6 +379,16 @@ class AdminUserViewSet(viewsets.ModelViewSet):
         self.perform_update(serializer)
         
         return Response(serializer.data)
+
+    def perform_update(self, serializer):
+        # Los tokens ya emitidos dejan de confiar en sus claims. La marca va antes
+        # de escribir: si Redis falla, la petición falla sin haber cambiado al usuario
+        mark_user_changed(serializer.instance.id)
+        serializer.save()
+
+    def perform_destroy(self, instance):
+        mark_user_changed(instance.id)
+        instance.delete()
     
 
 class AdminRegistrationView(APIView):